@@ -1,53 +1,31 @@
+import argparse
+
 from src.config import config
 from src.logger import setup_logger
-from src.radarr import RadarrClient
-from src.jellyfin import Jellyfin
-from src.sync import SyncManager
-from src.state_manager import load_state, save_state
+from src.daemon import SyncDaemon, build_clients, run_sync_cycle
+from src.state_manager import load_state
 
 logger = setup_logger(config.get("system", {}).get("log_level", "INFO"))
 
 if __name__ == "__main__":
-    logger.info("--- Starting Letterboxd-Jellyfin Sync ---")
+    parser = argparse.ArgumentParser(description="Letterboxd-Jellyfin Sync")
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Stay resident and run a sync every 'system.sync_interval' minutes.",
+    )
+    args = parser.parse_args()
 
-    sync_state = load_state()
+    logger.info("--- Starting Letterboxd-Jellyfin Sync ---")
 
     try:
-        jellyfin_client = Jellyfin(
-            url=config["jellyfin"]["url"], api_key=config["jellyfin"]["api_key"]
-        )
-        radarr_client = RadarrClient(
-            url=config["radarr"]["url"], api_key=config["radarr"]["api_key"]
-        )
+        jellyfin_client, radarr_client = build_clients()
     except KeyError as e:
         logger.error(f"Configuration error: Missing required key {e} in config.yaml")
         exit(1)
 
-    # Loop through users defined in the config file
-    for user_config in config.get("users", []):
-        username = user_config.get("letterboxd_username")
-        if not username:
-            logger.warning("Skipping user entry with no 'letterboxd_username'")
-            continue
-
-        logger.info(f"--- Processing user: {username} ---")
-        try:
-            last_synced_id = sync_state.get(username)
-
-            manager = SyncManager(
-                user_config, jellyfin_client, radarr_client, last_synced_id
-            )
-            new_latest_id = manager.run()
-
-            if new_latest_id:
-                sync_state[username] = new_latest_id
-
-        except Exception as e:
-            logger.error(
-                f"An unexpected error occurred for user {username}: {e}",
-                exc_info=True,
-            )
-
-    # Persist the updated state to sync_state.json
-    save_state(sync_state)
-    logger.info("--- Sync process finished ---")
+    if args.daemon:
+        SyncDaemon(jellyfin_client, radarr_client).run()
+    else:
+        run_sync_cycle(jellyfin_client, radarr_client, load_state())
+        logger.info("--- Sync process finished ---")
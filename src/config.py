@@ -1,14 +1,20 @@
+import os
 import yaml
 from typing import Any
 
-CONFIG_PATH = "config.yaml"
+CONFIG_PATH = os.getenv("CONFIG_PATH", "config.yaml")
+
+
+def _read_config() -> dict[str, Any]:
+    """Reads and parses the YAML configuration file."""
+    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
 
 
 def load_config() -> dict[str, Any]:
     """Loads the YAML configuration file."""
     try:
-        with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-            return yaml.safe_load(f)
+        return _read_config()
     except FileNotFoundError:
         print(f"ERROR: Configuration file not found at '{CONFIG_PATH}'")
         print("Please copy 'config.example.yaml' to 'config.yaml' and fill it out.")
@@ -18,4 +24,21 @@ def load_config() -> dict[str, Any]:
         exit(1)
 
 
+def reload_config() -> bool:
+    """
+    Re-reads the configuration file into the shared `config` dictionary in place,
+    so every module holding a reference to it sees the new values.
+    Keeps the current configuration and returns False if the file can't be read.
+    """
+    try:
+        new_config = _read_config()
+    except (OSError, yaml.YAMLError) as e:
+        print(f"ERROR: Could not reload configuration file, keeping the current one: {e}")
+        return False
+
+    config.clear()
+    config.update(new_config)
+    return True
+
+
 config = load_config()
@@ -0,0 +1,346 @@
+import logging
+import signal
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+from src.config import config, reload_config
+from src.html_parser import reset_html_parser
+from src.jellyfin import Jellyfin
+from src.jellyfin_index import JELLYFIN_INDEX_PATH, JellyfinMovieIndex
+from src.letterboxd import reset_request_slots
+from src.letterboxd_async import reset_async_request_slots
+from src.logger import setup_logger
+from src.page_cache import reset_page_cache
+from src.proxies import get_proxy_manager, reset_proxy_manager
+from src.radarr import RadarrClient
+from src.state_manager import get_user_state, load_state, save_state
+from src.sync import SyncManager
+from src.tmdb_cache import reset_tmdb_cache
+from src.webhooks import WebhookHandlers, WebhookServer
+
+logger = logging.getLogger("letterboxd-sync")
+
+# Delays (seconds) before re-checking Jellyfin for a movie Radarr just imported
+IMPORT_RETRY_DELAYS = (60, 300, 900)
+
+
+def build_clients() -> tuple[Jellyfin, RadarrClient]:
+    """
+    Creates the Jellyfin and Radarr clients from the current configuration.
+    Raises KeyError if a required key is missing.
+    """
+    movie_index = None
+    if config["jellyfin"].get("persistent_index", True):
+        movie_index = JellyfinMovieIndex(
+            JELLYFIN_INDEX_PATH,
+            config["jellyfin"].get("index_full_refresh_hours", 24) * 3600,
+        )
+
+    jellyfin_client = Jellyfin(
+        url=config["jellyfin"]["url"],
+        api_key=config["jellyfin"]["api_key"],
+        max_concurrent_requests=config["jellyfin"].get("max_concurrent_requests", 4),
+        timeout=config["jellyfin"].get("timeout", 20),
+        retries=config["jellyfin"].get("retries", 3),
+        page_size=config["jellyfin"].get("page_size", 500),
+        movie_index=movie_index,
+        user_cache_ttl=config["jellyfin"].get("user_cache_ttl_minutes", 60) * 60,
+    )
+    radarr_client = RadarrClient(
+        url=config["radarr"]["url"],
+        api_key=config["radarr"]["api_key"],
+        max_concurrent_requests=config["radarr"].get("max_concurrent_requests", 4),
+        timeout=config["radarr"].get("timeout", 20),
+        retries=config["radarr"].get("retries", 3),
+    )
+    return jellyfin_client, radarr_client
+
+
+def _merge_user_state(started: dict, current: dict, synced: dict) -> dict:
+    """
+    Merges the state a sync produced into the state stored now. Webhooks may have
+    dequeued pending movies while the sync ran: a movie the sync started with
+    stays pending only if it still is, while movies it queued itself are kept.
+    """
+    started_pending = set(started.get("pending", []))
+    current_pending = set(current.get("pending", []))
+    merged = dict(synced)
+    merged["pending"] = [
+        tmdb_id
+        for tmdb_id in synced.get("pending", [])
+        if tmdb_id not in started_pending or tmdb_id in current_pending
+    ]
+    return merged
+
+
+def _sync_user(
+    user_config: dict,
+    jellyfin_client: Jellyfin,
+    radarr_client: RadarrClient,
+    sync_state: dict,
+    state_lock: threading.Lock,
+) -> None:
+    """Runs the sync of a single user and records its new state."""
+    username = user_config["letterboxd_username"]
+    logger.info(f"--- Processing user: {username} ---")
+    try:
+        with state_lock:
+            user_state = get_user_state(sync_state, username)
+
+        manager = SyncManager(user_config, jellyfin_client, radarr_client, user_state)
+        new_user_state = manager.run()
+
+        with state_lock:
+            sync_state[username] = _merge_user_state(
+                user_state, get_user_state(sync_state, username), new_user_state
+            )
+
+    except Exception as e:
+        logger.error(
+            f"An unexpected error occurred for user {username}: {e}",
+            exc_info=True,
+        )
+
+
+def run_sync_cycle(
+    jellyfin_client: Jellyfin,
+    radarr_client: RadarrClient,
+    sync_state: dict,
+    state_lock=None,
+) -> None:
+    """
+    Runs one sync for every configured user and persists the updated state.
+    Users are synced concurrently, up to `system.max_parallel_users` at a time.
+    `state_lock` guards `sync_state` when other threads (webhooks) update it too.
+    """
+    # Movies may have been imported since the previous cycle
+    jellyfin_client.invalidate_movie_cache()
+    radarr_client.invalidate_library()
+
+    users = []
+    for user_config in config.get("users", []):
+        if not user_config.get("letterboxd_username"):
+            logger.warning("Skipping user entry with no 'letterboxd_username'")
+            continue
+        users.append(user_config)
+
+    max_parallel_users = config.get("system", {}).get("max_parallel_users", 4)
+    if state_lock is None:
+        state_lock = threading.Lock()
+
+    # Each user is isolated: a slow or failing sync only occupies its own worker
+    with ThreadPoolExecutor(
+        max_workers=max(1, max_parallel_users), thread_name_prefix="user-sync"
+    ) as executor:
+        for user_config in users:
+            executor.submit(
+                _sync_user,
+                user_config,
+                jellyfin_client,
+                radarr_client,
+                sync_state,
+                state_lock,
+            )
+
+    # Persist the updated state to sync_state.json
+    with state_lock:
+        save_state(sync_state)
+
+    get_proxy_manager(config.get("letterboxd", {})).log_stats()
+
+
+class SyncDaemon:
+    """
+    Resident sync process with an in-process scheduler.
+    Clients, connection pools and caches stay warm between cycles.
+    SIGHUP reloads the configuration, SIGTERM/SIGINT stop after the current cycle.
+    """
+
+    def __init__(self, jellyfin_client: Jellyfin, radarr_client: RadarrClient):
+        self.jellyfin = jellyfin_client
+        self.radarr = radarr_client
+        self.sync_state = load_state()
+        self.state_lock = threading.Lock()
+        self._webhook_server: WebhookServer | None = None
+        self._stop_requested = False
+        self._reload_requested = False
+        self._wake = threading.Event()
+
+    def _handle_stop(self, signum, frame):
+        logger.info(f"Received signal {signum}, shutting down after the current cycle.")
+        self._stop_requested = True
+        self._wake.set()
+
+    def _handle_reload(self, signum, frame):
+        logger.info("Received SIGHUP, configuration will be reloaded.")
+        self._reload_requested = True
+        self._wake.set()
+
+    def _reload(self):
+        """Reloads the configuration and rebuilds the service clients."""
+        self._reload_requested = False
+        if not reload_config():
+            return
+
+        setup_logger(config.get("system", {}).get("log_level", "INFO"))
+        # Process-wide Letterboxd helpers are rebuilt from the new settings on next use.
+        # Environment variables (CONFIG_PATH, SYNC_STATE_PATH, *_CACHE_PATH) need a restart.
+        reset_proxy_manager()
+        reset_html_parser()
+        reset_request_slots()
+        reset_async_request_slots()
+        reset_tmdb_cache()
+        reset_page_cache()
+        try:
+            self.jellyfin, self.radarr = build_clients()
+        except KeyError as e:
+            logger.error(
+                f"Configuration error: Missing required key {e} in config.yaml. Keeping previous clients."
+            )
+        except Exception as e:
+            logger.error(f"Could not rebuild clients after reload: {e}")
+        self._stop_webhooks()
+        self._start_webhooks()
+        logger.info("Configuration reloaded.")
+
+    def _start_webhooks(self):
+        """Starts the webhook listener if it is enabled in the configuration."""
+        webhook_config = config.get("webhooks", {})
+        if not webhook_config.get("enabled"):
+            return
+        token = webhook_config.get("token")
+        if not token:
+            # Anyone reaching the port could otherwise change users' collections
+            logger.error(
+                "Webhook listener not started: 'webhooks.token' must be set when webhooks are enabled."
+            )
+            return
+        try:
+            self._webhook_server = WebhookServer(
+                webhook_config.get("host", "0.0.0.0"),
+                webhook_config.get("port", 8787),
+                str(token),
+                WebhookHandlers(self.on_movie_imported, self.on_movie_played),
+            )
+            self._webhook_server.start()
+        except OSError as e:
+            logger.error(f"Could not start webhook listener: {e}")
+            self._webhook_server = None
+
+    def _stop_webhooks(self):
+        if self._webhook_server is not None:
+            self._webhook_server.stop()
+            self._webhook_server = None
+
+    def on_movie_imported(self, tmdb_id: str, attempt: int = 0):
+        """
+        Targeted update after Radarr imported a movie: add it to the collection of
+        every user waiting for it. Jellyfin may not have scanned the file yet, so
+        the lookup is retried a few times before leaving it to the next full cycle.
+        """
+        with self.state_lock:
+            waiting_users = [
+                user_config
+                for user_config in config.get("users", [])
+                if user_config.get("letterboxd_username")
+                and user_config.get("jellyfin_collection_id")
+                and tmdb_id
+                in get_user_state(
+                    self.sync_state, user_config["letterboxd_username"]
+                ).get("pending", [])
+            ]
+        if not waiting_users:
+            return
+
+        # Pick up the new file through an incremental index refresh
+        self.jellyfin.invalidate_movie_cache()
+        jellyfin_id = self.jellyfin.get_movie_id(tmdb_id=tmdb_id)
+        if not jellyfin_id:
+            if attempt < len(IMPORT_RETRY_DELAYS) and not self._stop_requested:
+                delay = IMPORT_RETRY_DELAYS[attempt]
+                logger.info(
+                    f"TMDB ID {tmdb_id} is not in Jellyfin yet, retrying in {delay}s."
+                )
+                timer = threading.Timer(
+                    delay, self._retry_movie_imported, (tmdb_id, attempt + 1)
+                )
+                timer.daemon = True
+                timer.start()
+            return
+
+        for user_config in waiting_users:
+            username = user_config["letterboxd_username"]
+            self.jellyfin.reconcile_collection(
+                user_config["jellyfin_collection_id"], [jellyfin_id], [], username
+            )
+            with self.state_lock:
+                user_state = get_user_state(self.sync_state, username)
+                user_state["pending"] = [
+                    pending_id
+                    for pending_id in user_state.get("pending", [])
+                    if pending_id != tmdb_id
+                ]
+                self.sync_state[username] = user_state
+            logger.info(f"[{username}] Added TMDB ID {tmdb_id} to Jellyfin collection.")
+
+        with self.state_lock:
+            save_state(self.sync_state)
+
+    def _retry_movie_imported(self, tmdb_id: str, attempt: int):
+        try:
+            self.on_movie_imported(tmdb_id, attempt)
+        except Exception as e:
+            logger.error(f"Webhook handler failed: {e}", exc_info=True)
+
+    def on_movie_played(self, item_id: str, jellyfin_username: str):
+        """Targeted update after a user watched a movie: remove it from their collections."""
+        for user_config in config.get("users", []):
+            collection_id = user_config.get("jellyfin_collection_id")
+            if user_config.get("jellyfin_username") != jellyfin_username or not collection_id:
+                continue
+            _, removed = self.jellyfin.reconcile_collection(
+                collection_id, [], [item_id], jellyfin_username
+            )
+            if not removed:
+                continue
+            logger.info(
+                f"[{user_config.get('letterboxd_username')}] Removed watched movie {item_id} from Jellyfin collection."
+            )
+
+    def _sync_interval(self) -> float:
+        return config.get("system", {}).get("sync_interval", 10) * 60
+
+    def run(self):
+        """Runs sync cycles until a stop signal is received."""
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+        self._start_webhooks()
+
+        while not self._stop_requested:
+            cycle_started = time.monotonic()
+            logger.info("--- Starting scheduled sync run ---")
+            try:
+                run_sync_cycle(
+                    self.jellyfin, self.radarr, self.sync_state, self.state_lock
+                )
+            except Exception as e:
+                logger.error(f"Sync cycle failed: {e}", exc_info=True)
+
+            logger.info(
+                f"--- Sync finished. Next run in {self._sync_interval() / 60:g} minutes. ---"
+            )
+
+            # Sleep until the next cycle, waking up early for signals
+            while not self._stop_requested:
+                remaining = cycle_started + self._sync_interval() - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._wake.wait(remaining)
+                self._wake.clear()
+                if self._reload_requested:
+                    self._reload()
+
+        self._stop_webhooks()
+        logger.info("--- Letterboxd-Jellyfin Sync daemon stopped ---")
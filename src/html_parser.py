@@ -0,0 +1,192 @@
+import logging
+import threading
+from typing import NamedTuple
+
+from bs4 import BeautifulSoup, SoupStrainer
+import bs4
+
+from src.config import config
+
+logger = logging.getLogger("letterboxd-sync")
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # pragma: no cover - optional dependency
+    LexborHTMLParser = None
+
+try:
+    import lxml.html
+    import lxml.etree
+except ImportError:  # pragma: no cover - optional dependency
+    lxml = None
+
+POSTER_SELECTOR = 'div[data-component-class="LazyPoster"]'
+TMDB_LINK_SELECTOR = 'a[data-track-action="TMDB"]'
+NEXT_PAGE_SELECTOR = "a.next"
+
+# Only the tags we read are kept in the BeautifulSoup tree: posters sit in grid list items
+_WATCHLIST_STRAINER = SoupStrainer(["li", "a"])
+_TMDB_LINK_STRAINER = SoupStrainer("a", attrs={"data-track-action": "TMDB"})
+
+
+class Poster(NamedTuple):
+    """A film of a watchlist page, as found in the poster grid markup."""
+
+    endpoint: str
+
+
+class WatchlistPage(NamedTuple):
+    posters: list[Poster]
+    next_href: str | None
+
+
+class HtmlParserBackend:
+    """
+    Extracts the few things the scraper needs from Letterboxd pages.
+    This backend is the pure-Python fallback, built on BeautifulSoup's html.parser.
+    """
+
+    name = "html.parser"
+
+    def _soup(self, content: bytes, parse_only: SoupStrainer | None) -> BeautifulSoup:
+        return BeautifulSoup(content, "html.parser", parse_only=parse_only)
+
+    def parse_watchlist(self, content: bytes) -> WatchlistPage:
+        soup = self._soup(content, _WATCHLIST_STRAINER)
+        frames = soup.find_all("div", {"data-component-class": "LazyPoster"})
+        if not frames:
+            # Posters outside of list items: fall back to the whole document
+            soup = self._soup(content, None)
+            frames = soup.find_all("div", {"data-component-class": "LazyPoster"})
+
+        posters = []
+        for frame in frames:
+            if not isinstance(frame, bs4.element.Tag) or "data-target-link" not in frame.attrs:
+                continue
+            posters.append(Poster(str(frame["data-target-link"])[1:]))
+
+        next_link = soup.find("a", {"class": "next"})
+        next_href = (
+            str(next_link["href"])
+            if isinstance(next_link, bs4.element.Tag) and "href" in next_link.attrs
+            else None
+        )
+        return WatchlistPage(posters, next_href)
+
+    def parse_tmdb_href(self, content: bytes) -> str | None:
+        soup = self._soup(content, _TMDB_LINK_STRAINER)
+        link = soup.find("a", attrs={"data-track-action": "TMDB"})
+        if isinstance(link, bs4.element.Tag) and "href" in link.attrs:
+            return str(link["href"])
+        return None
+
+
+class SelectolaxBackend(HtmlParserBackend):
+    """Backend using selectolax (lexbor), a C parser with CSS selectors."""
+
+    name = "selectolax"
+
+    def parse_watchlist(self, content: bytes) -> WatchlistPage:
+        tree = LexborHTMLParser(content)
+        posters = []
+        for node in tree.css(POSTER_SELECTOR):
+            target_link = node.attributes.get("data-target-link")
+            if target_link is None:
+                continue
+            posters.append(Poster(target_link[1:]))
+
+        next_link = tree.css_first(NEXT_PAGE_SELECTOR)
+        next_href = next_link.attributes.get("href") if next_link is not None else None
+        return WatchlistPage(posters, next_href)
+
+    def parse_tmdb_href(self, content: bytes) -> str | None:
+        link = LexborHTMLParser(content).css_first(TMDB_LINK_SELECTOR)
+        return link.attributes.get("href") if link is not None else None
+
+
+class LxmlBackend(HtmlParserBackend):
+    """Backend using lxml's libxml2 HTML parser and XPath."""
+
+    name = "lxml"
+
+    @staticmethod
+    def _tree(content: bytes):
+        try:
+            return lxml.html.fromstring(content)
+        except (lxml.etree.ParserError, ValueError):
+            return None
+
+    def parse_watchlist(self, content: bytes) -> WatchlistPage:
+        tree = self._tree(content)
+        if tree is None:
+            return WatchlistPage([], None)
+
+        posters = []
+        for node in tree.xpath('//div[@data-component-class="LazyPoster"]'):
+            target_link = node.get("data-target-link")
+            if target_link is None:
+                continue
+            posters.append(Poster(target_link[1:]))
+
+        next_links = tree.xpath(
+            '//a[contains(concat(" ", normalize-space(@class), " "), " next ")]/@href'
+        )
+        return WatchlistPage(posters, str(next_links[0]) if next_links else None)
+
+    def parse_tmdb_href(self, content: bytes) -> str | None:
+        tree = self._tree(content)
+        if tree is None:
+            return None
+        hrefs = tree.xpath('//a[@data-track-action="TMDB"]/@href')
+        return str(hrefs[0]) if hrefs else None
+
+
+_BACKENDS = {
+    "selectolax": (SelectolaxBackend, lambda: LexborHTMLParser is not None),
+    "lxml": (LxmlBackend, lambda: lxml is not None),
+    "html.parser": (HtmlParserBackend, lambda: True),
+}
+
+_parser: HtmlParserBackend | None = None
+_parser_lock = threading.Lock()
+
+
+def get_html_parser() -> HtmlParserBackend:
+    """
+    Returns the process-wide page parser selected by `letterboxd.html_parser`:
+    'auto' (the fastest installed backend), 'selectolax', 'lxml' or 'html.parser'.
+    An unavailable backend falls back to html.parser.
+    """
+    global _parser
+    with _parser_lock:
+        if _parser is not None:
+            return _parser
+
+        wanted = config.get("letterboxd", {}).get("html_parser", "auto")
+        candidates = list(_BACKENDS) if wanted == "auto" else [wanted]
+        for name in candidates:
+            if name not in _BACKENDS:
+                logger.warning(
+                    f"Unknown HTML parser '{name}', falling back to html.parser."
+                )
+                continue
+            backend_class, available = _BACKENDS[name]
+            if available():
+                _parser = backend_class()
+                break
+            if wanted != "auto":
+                logger.warning(
+                    f"HTML parser '{name}' is not installed, falling back to html.parser."
+                )
+
+        if _parser is None:
+            _parser = HtmlParserBackend()
+        logger.info(f"Parsing Letterboxd pages with {_parser.name}")
+        return _parser
+
+
+def reset_html_parser():
+    """Forgets the selected parser so the next call re-reads the configuration."""
+    global _parser
+    with _parser_lock:
+        _parser = None
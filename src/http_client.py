@@ -0,0 +1,65 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Methods that can safely be sent again after a transient failure
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+def build_session(
+    pool_size: int, retries: int = 3, backoff_factor: float = 0.5
+) -> requests.Session:
+    """
+    Returns a keep-alive session for a single service (Jellyfin, Radarr).
+
+    The connection pool is sized for `pool_size` concurrent requests. Idempotent
+    calls are retried with exponential backoff on connection errors and 5xx
+    responses; POSTs are only retried when the connection could not be made.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=IDEMPOTENT_METHODS,
+        respect_retry_after_header=True,
+        # Hand the last response back instead of raising, callers check status codes
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=1, pool_maxsize=max(1, pool_size), max_retries=retry
+    )
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class ServiceSession:
+    """
+    Pooled HTTP access to a single service (Jellyfin, Radarr), shared by every user
+    syncing in parallel: at most `max_concurrent_requests` requests are in flight.
+    """
+
+    def __init__(
+        self,
+        headers: dict[str, str],
+        max_concurrent_requests: int,
+        timeout: float,
+        retries: int,
+    ):
+        self.headers = headers
+        self.timeout = timeout
+        self.session = build_session(max_concurrent_requests, retries)
+        self._request_slots = threading.BoundedSemaphore(max_concurrent_requests)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Sends a request on the pooled session, bounded by the concurrency limit."""
+        kwargs.setdefault("timeout", self.timeout)
+        with self._request_slots:
+            return self.session.request(method, url, headers=self.headers, **kwargs)
@@ -1,4 +1,6 @@
 import sys
+import threading
+import time
 from pathlib import Path
 import requests
 from src.logger import setup_logger
@@ -7,17 +9,46 @@ root_path = Path(__file__).parent.parent
 sys.path.append(str(root_path))
 
 from src.exceptions import JellyfinException
+from src.http_client import ServiceSession
+from src.jellyfin_index import JellyfinMovieIndex
+
+# Items per add/remove request, to stay clear of URL length limits (HTTP 414)
+COLLECTION_BATCH_SIZE = 50
+
+# Minimum age (seconds) of the cached user map before an unknown username refetches it
+USER_MISS_REFRESH_INTERVAL = 60
 
 
 class Jellyfin:
-    def __init__(self, url: str, api_key: str) -> None:
+    def __init__(
+        self,
+        url: str,
+        api_key: str,
+        max_concurrent_requests: int = 4,
+        timeout: float = 20,
+        retries: int = 3,
+        page_size: int = 500,
+        movie_index: JellyfinMovieIndex | None = None,
+        user_cache_ttl: float = 3600,
+    ) -> None:
         if url.endswith("/"):
             url = url[:-1]
         self.base_url = url
-        self.headers = {
-            "Authorization": f'MediaBrowser Token="{api_key}"',
-        }
-        self._movie_cache: dict[tuple[str, int], str] | None = None
+        self._movie_cache: dict[tuple[str, str | int], str] | None = None
+        self._movie_cache_lock = threading.Lock()
+        # Optional on-disk index, refreshed incrementally instead of re-downloaded
+        self._movie_index = movie_index
+        self._user_ids: dict[str, str] | None = None
+        self._user_ids_fetched_at = 0.0
+        self._user_ids_lock = threading.Lock()
+        self.user_cache_ttl = user_cache_ttl
+        self.http = ServiceSession(
+            {"Authorization": f'MediaBrowser Token="{api_key}"'},
+            max_concurrent_requests,
+            timeout,
+            retries,
+        )
+        self.page_size = max(1, page_size)
         self.logger = setup_logger()
 
         # Test connection on initialization
@@ -27,7 +58,7 @@ class Jellyfin:
         """Test the connection to Jellyfin server."""
         url = self.base_url + "/System/Info"
         try:
-            response = requests.get(url, headers=self.headers, timeout=10)
+            response = self.http.request("GET", url)
             if response.status_code != 200:
                 raise JellyfinException(
                     f"Failed to connect to Jellyfin server: HTTP {response.status_code}"
@@ -37,27 +68,93 @@ class Jellyfin:
 
     def _get_movie_lookup_cache(self) -> dict:
         """
-        Builds a cache for mapping (Title, Year) to Jellyfin ID.
-        This is called once per sync instead of on every lookup.
+        Builds a cache mapping movies to their Jellyfin ID, keyed both by
+        ("tmdb", TMDB ID) from the item's ProviderIds and by (Title, Year) as a fallback.
+        This is called once per sync instead of on every lookup. With a persistent
+        index, only the movies changed since the previous refresh are fetched.
         """
-        if self._movie_cache is None:
-            self._movie_cache = {}
-            all_movies_response = self.get_movies()
-            for movie in all_movies_response.get("Items", []):
-                key = (movie.get("Name"), movie.get("ProductionYear"))
-                self._movie_cache[key] = movie.get("Id")
-        return self._movie_cache
-
-    def get_movie_id(self, movie_name: str, movie_year: int) -> str | None:
+        with self._movie_cache_lock:
+            if self._movie_cache is None:
+                if self._movie_index is not None:
+                    self._movie_index.refresh(self)
+                    self._movie_cache = self._movie_index.lookup_table()
+                    return self._movie_cache
+
+                movie_cache = {}
+                for movie in self.iter_movie_index_items():
+                    key = (movie.get("Name"), movie.get("ProductionYear"))
+                    movie_cache[key] = movie.get("Id")
+                    tmdb_id = (movie.get("ProviderIds") or {}).get("Tmdb")
+                    if tmdb_id:
+                        movie_cache[("tmdb", str(tmdb_id))] = movie.get("Id")
+                self._movie_cache = movie_cache
+            return self._movie_cache
+
+    def invalidate_movie_cache(self) -> None:
+        """Drops the movie lookup cache so the next lookup sees newly imported movies."""
+        with self._movie_cache_lock:
+            self._movie_cache = None
+
+    def get_movie_id(
+        self,
+        movie_name: str | None = None,
+        movie_year: int | None = None,
+        tmdb_id: str | int | None = None,
+    ) -> str | None:
         """
-        Get the Jellyfin ID of a movie from its name and year using the cache.
+        Get the Jellyfin ID of a movie using the cache.
+        Matches on the TMDB ID when given, falling back to an exact name and year match.
         """
         cache = self._get_movie_lookup_cache()
+        if tmdb_id is not None:
+            jellyfin_id = cache.get(("tmdb", str(tmdb_id)))
+            if jellyfin_id:
+                return jellyfin_id
+        if movie_name is None or movie_year is None:
+            return None
         return cache.get((movie_name, movie_year))
 
+    def iter_movie_index_items(self, min_date_last_saved: str | None = None):
+        """
+        Yield every movie in the Jellyfin library with only the fields needed for
+        indexing (Id, Name, ProductionYear, ProviderIds), one page at a time,
+        so the full library never has to sit in memory as a single JSON document.
+        With `min_date_last_saved`, only movies saved since that ISO date are returned.
+        """
+        url = self.base_url + "/Items"
+        params = {
+            "Recursive": "true",
+            "IncludeItemTypes": "Movie",
+            "Fields": "ProviderIds",
+            "SortBy": "SortName",
+            "EnableImages": "false",
+            "EnableUserData": "false",
+            "EnableTotalRecordCount": "false",
+            "Limit": self.page_size,
+        }
+        if min_date_last_saved:
+            params["MinDateLastSaved"] = min_date_last_saved
+
+        start_index = 0
+        while True:
+            params["StartIndex"] = start_index
+            response = self.http.request("GET", url, params=params)
+            if response.status_code != 200:
+                raise JellyfinException(
+                    f"Unable to make request to {url}. Status code: {response.status_code}, Response: {response.text}"
+                )
+
+            items = response.json().get("Items", [])
+            yield from items
+
+            if len(items) < self.page_size:
+                break
+            start_index += len(items)
+
     def get_movies(self) -> dict:
         """
-        Get all movies in the Jellyfin library
+        Get all movies in the Jellyfin library, enriched with media sources, people and directors.
+        This is a heavy query; use `iter_movie_index_items` when only IDs are needed.
         """
 
         url = self.base_url + "/Items"
@@ -66,7 +163,7 @@ class Jellyfin:
             "IncludeItemTypes": "Movie",
             "fields": "MediaSources,People",
         }
-        response = requests.get(url, params=params, headers=self.headers, timeout=20)
+        response = self.http.request("GET", url, params=params)
         if response.status_code != 200:
             raise JellyfinException(
                 f"Unable to make request to {url}. Status code: {response.status_code}, Response: {response.text}"
@@ -94,7 +191,7 @@ class Jellyfin:
             "IncludeItemTypes": "Series",
             "fields": "MediaSources",
         }
-        response = requests.get(url, params=params, headers=self.headers, timeout=20)
+        response = self.http.request("GET", url, params=params)
         if response.status_code != 200:
             raise JellyfinException(
                 f"Unable to make request to {url}. Status code: {response.status_code}, Response: {response.text}"
@@ -115,7 +212,7 @@ class Jellyfin:
             "IncludeItemTypes": "Series",
             "fields": "MediaSources",
         }
-        response = requests.get(url, params=params, headers=self.headers, timeout=20)
+        response = self.http.request("GET", url, params=params)
         if response.status_code != 200:
             raise JellyfinException(
                 f"Unable to make request to {url}. Status code: {response.status_code}, Response: {response.text}"
@@ -123,39 +220,49 @@ class Jellyfin:
 
         return response.json()
 
-    def add_to_user_collection(
-        self, movie_ids: list[str], username: str, collection_id: str
-    ) -> None:
+    def _send_collection_batches(
+        self, method: str, movie_ids: list[str], collection_id: str
+    ) -> int:
         """
-        Add movies to a collection, batching requests to avoid URL length limits
+        Adds (POST) or removes (DELETE) collection items, batching requests
+        to avoid URL length limits (HTTP 414 error). Returns the number of items sent.
         """
-        if not movie_ids:
-            return
-
-        if collection_id is None:
-            raise JellyfinException("Unable to find collection ID for " + username)
-
-        # Batch size to avoid URL length limits (HTTP 414 error)
-        batch_size = 50
         url = self.base_url + "/Collections/" + collection_id + "/Items"
 
-        total_added = 0
-        for i in range(0, len(movie_ids), batch_size):
-            batch = movie_ids[i : i + batch_size]
+        total_sent = 0
+        for i in range(0, len(movie_ids), COLLECTION_BATCH_SIZE):
+            batch = movie_ids[i : i + COLLECTION_BATCH_SIZE]
             params = {"ids": ",".join(batch)}
-            response = requests.post(
-                url, headers=self.headers, params=params, timeout=20
-            )
+
+            response = self.http.request(method, url, params=params)
+
             if response.status_code != 204:
+                self.logger.error(
+                    f"Failed to update collection {collection_id} ({method}). Status: {response.status_code}, Response: {response.text}"
+                )
                 raise JellyfinException(
                     f"Unable to make request to {url}. Status code: {response.status_code}, Response: {response.text}"
                 )
 
-            total_added += len(batch)
+            total_sent += len(batch)
             self.logger.debug(
-                f"Added batch of {len(batch)} movies to collection {collection_id} for user {username}"
+                f"Sent batch of {len(batch)} movies ({method}) to collection {collection_id}"
             )
+        return total_sent
 
+    def add_to_user_collection(
+        self, movie_ids: list[str], username: str, collection_id: str
+    ) -> None:
+        """
+        Add movies to a collection, batching requests to avoid URL length limits
+        """
+        if not movie_ids:
+            return
+
+        if collection_id is None:
+            raise JellyfinException("Unable to find collection ID for " + username)
+
+        total_added = self._send_collection_batches("POST", movie_ids, collection_id)
         self.logger.info(
             f"Successfully added {total_added} movies to collection for user {username}"
         )
@@ -167,32 +274,7 @@ class Jellyfin:
         if not movie_ids:
             return
 
-        # Batch size to avoid URL length limits (HTTP 414 error)
-        batch_size = 50
-        url = self.base_url + "/Collections/" + collection_id + "/Items"
-
-        total_added = 0
-        for i in range(0, len(movie_ids), batch_size):
-            batch = movie_ids[i : i + batch_size]
-            params = {"ids": ",".join(batch)}
-
-            response = requests.post(
-                url, headers=self.headers, params=params, timeout=20
-            )
-
-            if response.status_code != 204:
-                self.logger.error(
-                    f"Failed to add movies batch to collection. Status: {response.status_code}, Response: {response.text}"
-                )
-                raise JellyfinException(
-                    f"Unable to make request to {url}. Status code: {response.status_code}, Response: {response.text}"
-                )
-
-            total_added += len(batch)
-            self.logger.debug(
-                f"Added batch of {len(batch)} movies to collection {collection_id}"
-            )
-
+        total_added = self._send_collection_batches("POST", movie_ids, collection_id)
         self.logger.info(
             f"Successfully added {total_added} movies to collection {collection_id}"
         )
@@ -208,7 +290,7 @@ class Jellyfin:
             "IncludeItemTypes": "Movie",
             "Filters": "IsPlayed",
         }
-        response = requests.get(url, params=params, headers=self.headers, timeout=20)
+        response = self.http.request("GET", url, params=params)
 
         played_movie_ids = []
         if response.status_code == 200:
@@ -231,8 +313,10 @@ class Jellyfin:
             "ParentId": collection_id,
             "Recursive": "true",
             "IncludeItemTypes": "Movie",
+            "EnableImages": "false",
+            "EnableUserData": "false",
         }
-        response = requests.get(url, params=params, headers=self.headers, timeout=20)
+        response = self.http.request("GET", url, params=params)
         if response.status_code != 200:
             raise JellyfinException(
                 f"Unable to make request to {url}. Status code: {response.status_code}, Response: {response.text}"
@@ -243,37 +327,92 @@ class Jellyfin:
         return set(map(lambda x: x["Id"], res["Items"]))
 
     def remove_from_collection(self, movie_ids: list[str], collection_id: str) -> None:
-        """Remove movies from a collection by their Jellyfin IDs."""
+        """Remove movies from a collection by their Jellyfin IDs, in batches."""
         if not movie_ids:
             return
 
         if collection_id is None:
             raise JellyfinException("Cannot remove from a null collection ID")
 
-        url = self.base_url + "/Collections/" + collection_id + "/Items"
-        params = {"ids": ",".join(movie_ids)}
-        response = requests.delete(url, headers=self.headers, params=params, timeout=20)
-        if response.status_code != 204:
-            raise JellyfinException(
-                f"Unable to make request to {url}. Status code: {response.status_code}, Response: {response.text}"
-            )
+        total_removed = self._send_collection_batches(
+            "DELETE", movie_ids, collection_id
+        )
+        self.logger.info(
+            f"Successfully removed {total_removed} movies from collection {collection_id}"
+        )
 
-    def get_user_id(self, username: str) -> str | None:
+    def reconcile_collection(
+        self,
+        collection_id: str,
+        movie_ids_to_add: list[str],
+        movie_ids_to_remove: list[str],
+        username: str = "",
+    ) -> tuple[int, int]:
         """
-        Get a user's ID from their username
+        Brings a collection to (current members + additions - removals).
+        Reads the current membership once and only sends the difference:
+        movies already in the collection are not re-posted and movies that
+        aren't members are not deleted. Returns (added, removed) counts.
         """
+        if not movie_ids_to_add and not movie_ids_to_remove:
+            return 0, 0
 
-        url = self.base_url + "/Users"
-        response = requests.get(url, headers=self.headers, timeout=20)
-        if response.status_code != 200:
-            raise JellyfinException(
-                f"Unable to make request to {url}. Status code: {response.status_code}, Response: {response.text}"
-            )
+        current = self.get_collection_movies(username, collection_id)
+        removals = set(movie_ids_to_remove)
+        desired = (current | set(movie_ids_to_add)) - removals
 
-        res = response.json()
+        # Keep the caller's order for additions, so batches are deterministic
+        to_add = list(
+            dict.fromkeys(i for i in movie_ids_to_add if i in desired and i not in current)
+        )
+        to_remove = [i for i in dict.fromkeys(movie_ids_to_remove) if i in current]
+
+        if to_add:
+            self._send_collection_batches("POST", to_add, collection_id)
+        if to_remove:
+            self._send_collection_batches("DELETE", to_remove, collection_id)
+
+        self.logger.info(
+            f"Reconciled collection {collection_id} for user {username}: {len(to_add)} added, {len(to_remove)} removed, "
+            f"{len(desired)} movies in collection."
+        )
+        return len(to_add), len(to_remove)
 
-        for user in res:
-            if user.get("Name") == username:
-                return user.get("Id")
+    def get_user_ids(self, max_age: float | None = None) -> dict[str, str]:
+        """
+        Get the name -> ID map of all Jellyfin users.
+        Fetched in a single request and cached for `user_cache_ttl` seconds,
+        or `max_age` seconds when given.
+        """
+        if max_age is None:
+            max_age = self.user_cache_ttl
+        with self._user_ids_lock:
+            if (
+                self._user_ids is not None
+                and time.monotonic() - self._user_ids_fetched_at < max_age
+            ):
+                return self._user_ids
+
+            url = self.base_url + "/Users"
+            response = self.http.request("GET", url)
+            if response.status_code != 200:
+                raise JellyfinException(
+                    f"Unable to make request to {url}. Status code: {response.status_code}, Response: {response.text}"
+                )
+
+            self._user_ids = {
+                user.get("Name"): user.get("Id") for user in response.json()
+            }
+            self._user_ids_fetched_at = time.monotonic()
+            return self._user_ids
 
-        return None
+    def get_user_id(self, username: str) -> str | None:
+        """
+        Get a user's ID from their username.
+        An unknown name refreshes the cached map, so users created since the last
+        fetch are found; such refreshes happen at most every USER_MISS_REFRESH_INTERVAL.
+        """
+        user_id = self.get_user_ids().get(username)
+        if user_id is None:
+            user_id = self.get_user_ids(max_age=USER_MISS_REFRESH_INTERVAL).get(username)
+        return user_id
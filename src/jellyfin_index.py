@@ -0,0 +1,123 @@
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable, Protocol
+
+from src.state_manager import data_file_path
+
+logger = logging.getLogger("letterboxd-sync")
+
+JELLYFIN_INDEX_PATH = data_file_path("JELLYFIN_INDEX_PATH", "jellyfin_index.json")
+
+# Items saved shortly before the previous refresh are fetched again,
+# to absorb clock drift between this host and the Jellyfin server
+CLOCK_SKEW_MARGIN = timedelta(minutes=10)
+
+
+class MovieSource(Protocol):
+    def iter_movie_index_items(
+        self, min_date_last_saved: str | None = None
+    ) -> Iterable[dict[str, Any]]: ...
+
+
+class JellyfinMovieIndex:
+    """
+    On-disk index of the Jellyfin movie library (Id, Name, ProductionYear, TMDB ID).
+
+    Refreshes are incremental: only items saved since the previous refresh are
+    fetched, using Jellyfin's MinDateLastSaved filter. A full reconcile runs every
+    `full_refresh_interval` seconds to drop movies deleted from the library.
+    """
+
+    def __init__(self, path: str, full_refresh_interval: float):
+        self.path = path
+        self.full_refresh_interval = full_refresh_interval
+        self.items: dict[str, dict[str, Any]] = {}
+        self.last_refresh: str | None = None
+        self.last_full_refresh = 0.0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.items = data.get("items", {})
+            self.last_refresh = data.get("last_refresh")
+            self.last_full_refresh = data.get("last_full_refresh", 0.0)
+        except (json.JSONDecodeError, IOError) as e:
+            logger.warning(
+                f"Could not read Jellyfin index at '{self.path}', rebuilding it: {e}"
+            )
+            self.items = {}
+
+    def _save(self):
+        data = {
+            "last_refresh": self.last_refresh,
+            "last_full_refresh": self.last_full_refresh,
+            "items": self.items,
+        }
+        try:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except IOError as e:
+            logger.error(f"Could not write Jellyfin index to '{self.path}': {e}")
+
+    @staticmethod
+    def _entry(movie: dict[str, Any]) -> dict[str, Any]:
+        tmdb_id = (movie.get("ProviderIds") or {}).get("Tmdb")
+        return {
+            "name": movie.get("Name"),
+            "year": movie.get("ProductionYear"),
+            "tmdb": str(tmdb_id) if tmdb_id else None,
+        }
+
+    def refresh(self, source: MovieSource):
+        """Brings the index up to date, incrementally when possible."""
+        started = datetime.now(timezone.utc)
+        full = (
+            not self.items
+            or self.last_refresh is None
+            or time.time() - self.last_full_refresh > self.full_refresh_interval
+        )
+
+        if full:
+            items = {
+                movie["Id"]: self._entry(movie)
+                for movie in source.iter_movie_index_items()
+                if movie.get("Id")
+            }
+            self.items = items
+            self.last_full_refresh = time.time()
+            logger.info(f"Rebuilt Jellyfin movie index with {len(items)} movies.")
+        else:
+            since = datetime.fromisoformat(self.last_refresh) - CLOCK_SKEW_MARGIN
+            changed = 0
+            for movie in source.iter_movie_index_items(
+                min_date_last_saved=since.strftime("%Y-%m-%dT%H:%M:%SZ")
+            ):
+                if movie.get("Id"):
+                    self.items[movie["Id"]] = self._entry(movie)
+                    changed += 1
+            logger.info(
+                f"Refreshed Jellyfin movie index: {changed} changed movies, {len(self.items)} total."
+            )
+
+        self.last_refresh = started.isoformat()
+        self._save()
+
+    def lookup_table(self) -> dict[tuple[str, str | int], str]:
+        """
+        Returns a mapping to Jellyfin IDs keyed by ("tmdb", TMDB ID) and by (Name, Year).
+        """
+        table: dict[tuple[str, str | int], str] = {}
+        for jellyfin_id, entry in self.items.items():
+            table[(entry["name"], entry["year"])] = jellyfin_id
+            if entry["tmdb"]:
+                table[("tmdb", entry["tmdb"])] = jellyfin_id
+        return table
@@ -1,16 +1,57 @@
-from concurrent.futures import ThreadPoolExecutor
-from bs4 import BeautifulSoup
-import bs4
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
+import queue
+import re
+import threading
 import logging
+from typing import Any, Mapping, NamedTuple
 
+from src.config import config
+from src.html_parser import Poster, WatchlistPage, get_html_parser
+from src.page_cache import CachedPage, PageCache, conditional_headers, get_page_cache
 from src.proxies import ProxyManager, make_request
+from src.tmdb_cache import get_tmdb_cache
 
 URL = "https://letterboxd.com/"
+
+# The complete opening tag of a film page's TMDB link, e.g.
+# <a href="https://www.themoviedb.org/movie/123/" ... data-track-action="TMDB">
+TMDB_ANCHOR_PATTERN = re.compile(rb'<a\s[^>]*data-track-action="TMDB"[^>]*>')
 logger = logging.getLogger("letterboxd-sync")
 
+# Process-wide cap on in-flight Letterboxd requests, shared by all users syncing in parallel
+_request_slots: threading.BoundedSemaphore | None = None
+_request_slots_lock = threading.Lock()
+
+
+def get_request_slots() -> threading.BoundedSemaphore:
+    """Returns the semaphore bounding concurrent Letterboxd requests across all users."""
+    global _request_slots
+    with _request_slots_lock:
+        if _request_slots is None:
+            letterboxd_config = config.get("letterboxd", {})
+            _request_slots = threading.BoundedSemaphore(
+                letterboxd_config.get(
+                    "max_global_requests",
+                    letterboxd_config.get("max_concurrent_requests", 5),
+                )
+            )
+        return _request_slots
+
+
+def reset_request_slots():
+    """Rebuilds the global request budget on next use, e.g. after a configuration reload."""
+    global _request_slots
+    with _request_slots_lock:
+        _request_slots = None
+
 
 def make_letterboxd_request(
-    endpoint: str, proxy_manager: ProxyManager, retries: int = 3
+    endpoint: str,
+    proxy_manager: ProxyManager,
+    retries: int = 3,
+    stop_at: re.Pattern[bytes] | None = None,
+    extra_headers: dict[str, str] | None = None,
 ):
     """Make a request to the Letterboxd API
 
@@ -18,6 +59,8 @@ def make_letterboxd_request(
         endpoint (str): The Letterboxd API endpoint
         proxy_manager (ProxyManager): The proxy manager instance
         retries (int): The number of times to retry the request if it fails
+        stop_at (re.Pattern | None): Stop downloading the body once this pattern is read
+        extra_headers (dict | None): Additional request headers
 
     Returns:
         requests.Response: The response from the API
@@ -27,8 +70,17 @@ def make_letterboxd_request(
     for attempt in range(retries):
         proxy = proxy_manager.get_proxy()
         try:
-            # Pass the selected proxy to the generic make_request function with fallback setting from proxy manager
-            return make_request(url, proxy, allow_fallback=proxy_manager.allow_fallback)
+            # Pass the selected proxy to the generic make_request function with fallback setting from proxy manager.
+            # The global slot is only taken once the rate limiter lets the request go.
+            return make_request(
+                url,
+                proxy,
+                allow_fallback=proxy_manager.allow_fallback,
+                proxy_manager=proxy_manager,
+                stop_at=stop_at,
+                extra_headers=extra_headers,
+                request_slots=get_request_slots(),
+            )
         except Exception as e:
             if proxy:
                 proxy_url = proxy.get("https", proxy.get("http", "unknown"))
@@ -44,99 +96,337 @@ def make_letterboxd_request(
     return None  # Return None on persistent failure
 
 
-def extract_tmdb_id_from_endpoint(
-    endpoint: str, proxy_manager: ProxyManager
-) -> str | None:
-    """From a Letterboxd film endpoint, extract the TMDB ID."""
-    movie_page = make_letterboxd_request(endpoint, proxy_manager)
-    if movie_page is None:
+def _revalidated_body(
+    page_cache: PageCache | None,
+    url: str,
+    cached: CachedPage | None,
+    status: int,
+    headers: Mapping[str, Any],
+    body: bytes,
+) -> bytes:
+    """
+    Returns the up-to-date body of a conditionally requested page: the cached copy
+    on 304 Not Modified, else the fresh body, which then replaces the cached copy.
+    """
+    if status == 304 and cached is not None:
+        logger.debug(f"{url} not modified, using cached copy")
+        return cached.body
+    if page_cache is not None:
+        page_cache.store(url, headers.get("ETag"), headers.get("Last-Modified"), body)
+    return body
+
+
+def fetch_watchlist_page(endpoint: str, proxy_manager: ProxyManager) -> bytes | None:
+    """
+    Fetch a watchlist page, revalidating the cached copy with a conditional request.
+    Returns the page body, or None on persistent failure.
+    """
+    url = URL + endpoint
+    page_cache = get_page_cache()
+    cached = page_cache.lookup(url) if page_cache is not None else None
+
+    response = make_letterboxd_request(
+        endpoint, proxy_manager, extra_headers=conditional_headers(cached)
+    )
+    if response is None:
         return None
+    return _revalidated_body(
+        page_cache, url, cached, response.status_code, response.headers, response.content
+    )
+
 
-    movie_soup = BeautifulSoup(movie_page.content, "html.parser")
-    tmdb_link_tag = movie_soup.find("a", attrs={"data-track-action": "TMDB"})
-    if (
-        not isinstance(tmdb_link_tag, bs4.element.Tag)
-        or "href" not in tmdb_link_tag.attrs
-    ):
+class WatchlistScan(NamedTuple):
+    # New films since the last sync, the most recently added first
+    tmdb_ids: list[str]
+    # Fingerprint of the first watchlist page, None if it could not be fetched
+    fingerprint: str | None
+    # Slugs of the films at the top of the watchlist, where the next sync stops
+    anchors: list[str]
+
+
+def watchlist_fingerprint(watchlist_page: WatchlistPage) -> str:
+    """
+    Hash of the film slugs of a watchlist page, in order. Unlike validators or a
+    hash of the HTML, it only changes when the films on the page change.
+    """
+    slugs = "\n".join(poster.endpoint for poster in watchlist_page.posters)
+    return hashlib.sha1(slugs.encode()).hexdigest()
+
+
+def watchlist_anchors(watchlist_page: WatchlistPage) -> list[str]:
+    """
+    Returns the slugs of the first `letterboxd.anchor_count` films of a (first)
+    watchlist page. The next sync stops where they line up again (see AnchorMatcher),
+    so removing or watching a few of them does not trigger a full-watchlist scrape.
+    """
+    anchor_count = config.get("letterboxd", {}).get("anchor_count", 10)
+    return [poster.endpoint for poster in watchlist_page.posters[:anchor_count]]
+
+
+class AnchorMatcher:
+    """
+    Finds where the films of the last sync start on the watchlist, page by page.
+
+    A single anchor is not trusted: a film re-added to the watchlist moves back
+    to the top, ahead of films added after it. The scrape only stops at an anchor
+    directly followed by a later anchor of the recorded run (anchors removed in
+    between are skipped), or at an anchor ending the watchlist. The last recorded
+    anchor can therefore only confirm an earlier one.
+    """
+
+    def __init__(self, anchors: list[str]):
+        self.positions = {slug: idx for idx, slug in enumerate(anchors)}
+        # Anchor at the end of the previous page, confirmed by the next page's first film
+        self._candidate: Poster | None = None
+
+    def cut(self, watchlist_page: WatchlistPage) -> tuple[WatchlistPage, str | None]:
+        """
+        Returns the page with only the films that precede the last sync, and the
+        anchor slug the scrape stops at (None to keep going). An anchor at the end
+        of a page is held back and returned with the next page's films if needed.
+        """
+        films: list[Poster] = []
+        for poster in watchlist_page.posters:
+            candidate = self._candidate
+            if candidate is not None:
+                self._candidate = None
+                if self.positions.get(poster.endpoint, -1) > self.positions[candidate.endpoint]:
+                    return watchlist_page._replace(posters=films), candidate.endpoint
+                films.append(candidate)
+            if poster.endpoint in self.positions:
+                self._candidate = poster
+            else:
+                films.append(poster)
+
+        if self._candidate is not None and watchlist_page.next_href is None:
+            # Re-added films go to the top, so an anchor ending the watchlist is old
+            return watchlist_page._replace(posters=films), self._candidate.endpoint
+        return watchlist_page._replace(posters=films), None
+
+
+def _parse_tmdb_id(content: bytes, endpoint: str) -> tuple[str | None, str | None]:
+    """
+    Parse the TMDB ID out of a Letterboxd film page.
+    Returns a (tmdb_id, reason) tuple where reason explains a missing ID.
+    """
+    tmdb_href = get_html_parser().parse_tmdb_href(content)
+    if tmdb_href is None:
         logger.warning(f"Could not find TMDB link for movie at endpoint: {endpoint}")
-        return None
+        return None, "missing"
     try:
-        if "/tv/" in tmdb_link_tag["href"]:
+        if "/tv/" in tmdb_href:
             logger.info(f"Skipping TV show at endpoint: {endpoint}")
-            return None
-        tmdb_id = str(tmdb_link_tag["href"]).split("/")[-2]
-        return tmdb_id
+            return None, "tv"
+        tmdb_id = tmdb_href.split("/")[-2]
+        return tmdb_id, None
     except IndexError:
-        logger.warning(f"Could not parse TMDB ID from href: {tmdb_link_tag['href']}")
+        logger.warning(f"Could not parse TMDB ID from href: {tmdb_href}")
+        return None, "unparsable"
+
+
+def film_page_stop_pattern() -> re.Pattern[bytes] | None:
+    """
+    Returns the pattern film page downloads stop at, or None to download whole pages.
+    The page is only cut after the complete TMDB link tag, and a page without it is
+    read to the end, so parsing the partial body finds the same link as a full parse.
+    """
+    if config.get("letterboxd", {}).get("stream_film_pages", True):
+        return TMDB_ANCHOR_PATTERN
+    return None
+
+
+def extract_tmdb_id_from_endpoint(
+    endpoint: str, proxy_manager: ProxyManager
+) -> str | None:
+    """
+    From a Letterboxd film endpoint, extract the TMDB ID.
+    The persistent slug cache is checked first and filled on a miss.
+    """
+    cache = get_tmdb_cache()
+    if cache is not None:
+        hit, tmdb_id = cache.lookup(endpoint)
+        if hit:
+            return tmdb_id
+
+    movie_page = make_letterboxd_request(
+        endpoint, proxy_manager, stop_at=film_page_stop_pattern()
+    )
+    if movie_page is None:
+        # Network failures are transient and must not be cached
         return None
 
+    tmdb_id, reason = _parse_tmdb_id(movie_page.content, endpoint)
+    if cache is not None:
+        cache.store(endpoint, tmdb_id, reason)
+    return tmdb_id
+
+
+def _resolved_future(tmdb_id: str | None) -> Future:
+    """Wraps an already known TMDB ID so it can be consumed like a pending lookup."""
+    future: Future = Future()
+    future.set_result(tmdb_id)
+    return future
+
+
+def _resolve_page_films(
+    watchlist_page: WatchlistPage,
+) -> list[tuple[str, bool, str | None]]:
+    """
+    Resolve the films of a watchlist page already in the slug cache, with one bulk
+    query for the page. Films never seen before still cost one film page fetch each.
+    Returns (endpoint, resolved, tmdb_id) tuples in the order they appear on the page.
+    """
+    endpoints = [poster.endpoint for poster in watchlist_page.posters]
+
+    cache = get_tmdb_cache()
+    cached_ids = cache.lookup_many(endpoints) if cache is not None else {}
+
+    return [
+        (endpoint, endpoint in cached_ids, cached_ids.get(endpoint))
+        for endpoint in endpoints
+    ]
+
+
+def _submit_page_films(
+    watchlist_page: WatchlistPage,
+    executor: ThreadPoolExecutor,
+    proxy_manager: ProxyManager,
+) -> list[Future]:
+    """
+    Schedule TMDB ID resolution for every film on a watchlist page.
+    Returns one future per film, in the order they appear on the page.
+    """
+    # Submit a film page scrape only for films missing from the cache
+    return [
+        _resolved_future(tmdb_id)
+        if resolved
+        else executor.submit(extract_tmdb_id_from_endpoint, endpoint, proxy_manager)
+        for endpoint, resolved, tmdb_id in _resolve_page_films(watchlist_page)
+    ]
+
+
+def _put_until_stopped(
+    pages: queue.Queue, item: list[Future] | None, stop_event: threading.Event
+) -> bool:
+    """Put an item on the bounded page queue, giving up once a stop is requested."""
+    while not stop_event.is_set():
+        try:
+            pages.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
 
 def get_new_watchlist_tmdb_ids(
     username: str,
     proxy_manager: ProxyManager,
     max_workers: int,
     latest_synced_tmdb_id: str | None,
-) -> list[str]:
+    page_lookahead: int = 2,
+    known_fingerprint: str | None = None,
+    anchors: list[str] | None = None,
+) -> WatchlistScan:
     """
     Get TMDB IDs of new films in a user's watchlist since the last sync, using parallel workers.
-    Stops when it encounters `latest_synced_tmdb_id`.
+    Stops where the `anchors` slugs of the last sync line up (see `AnchorMatcher`),
+    or when it encounters `latest_synced_tmdb_id` (only passed for state written
+    before anchors existed), and right after
+    the first page when that page still has `known_fingerprint` (the watchlist did not change).
+
+    Watchlist pages are fetched by a producer thread that runs up to `page_lookahead`
+    pages ahead of the consumer, while film lookups for every page share one pool.
 
     Args:
         username (str): The Letterboxd username.
         proxy_manager (ProxyManager): The proxy manager instance.
         max_workers (int): The number of parallel requests for scraping.
         latest_synced_tmdb_id (str | None): The TMDB ID of the last movie synced.
+        page_lookahead (int): The number of watchlist pages to prefetch.
+        known_fingerprint (str | None): The first page fingerprint of the last sync.
+        anchors (list[str] | None): Slugs of the films at the top of the watchlist at the last sync.
 
     Returns:
-        list: A list of new TMDB IDs, with the most recently added film first.
+        WatchlistScan: The new TMDB IDs, with the most recently added film first,
+        and the fingerprint and anchors of the first page.
     """
-    page_idx = 1
     logger.info(
         f"[{username}] Starting incremental watchlist scrape with {max_workers} workers..."
     )
+    anchor_matcher = AnchorMatcher(anchors or [])
+    if anchors:
+        logger.info(
+            f"[{username}] Will stop where the {len(anchors)} films at the top of the watchlist during the last sync are found."
+        )
     if latest_synced_tmdb_id:
         logger.info(
             f"[{username}] Will stop when TMDB ID '{latest_synced_tmdb_id}' is found."
         )
 
-    watchlist_page = make_letterboxd_request(f"{username}/watchlist/", proxy_manager)
-    if not watchlist_page:
+    content = fetch_watchlist_page(f"{username}/watchlist/", proxy_manager)
+    if content is None:
         logger.error(f"[{username}] Could not fetch initial watchlist page. Aborting.")
-        return []
+        return WatchlistScan([], None, [])
+
+    parser = get_html_parser()
+    first_page = parser.parse_watchlist(content)
+    fingerprint = watchlist_fingerprint(first_page)
+    new_anchors = watchlist_anchors(first_page)
+    if known_fingerprint is not None and fingerprint == known_fingerprint:
+        logger.info(
+            f"[{username}] Watchlist unchanged since the last sync. Skipping scrape."
+        )
+        return WatchlistScan([], fingerprint, new_anchors)
+
+    pages: queue.Queue = queue.Queue(maxsize=max(1, page_lookahead))
+    stop_event = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def produce_pages():
+        page: WatchlistPage | None = first_page
+        page_idx = 1
+        try:
+            while page is not None and not stop_event.is_set():
+                page, anchor = anchor_matcher.cut(page)
+                page_futures = _submit_page_films(page, executor, proxy_manager)
+                if not _put_until_stopped(pages, page_futures, stop_event):
+                    return
 
-    watchlist_soup: BeautifulSoup | None = BeautifulSoup(
-        watchlist_page.content, "html.parser"
+                if anchor is not None:
+                    logger.info(
+                        f"[{username}] Found film from the last sync ({anchor}). Stopping scrape."
+                    )
+                    break
+                if page.next_href is None:
+                    break
+
+                page_idx += 1
+                logger.info(f"[{username}] Getting watchlist page {page_idx}")
+                content = fetch_watchlist_page(page.next_href, proxy_manager)
+                page = parser.parse_watchlist(content) if content is not None else None
+        except RuntimeError:
+            # The executor was shut down after an early stop
+            pass
+        except Exception as exc:
+            logger.error(f"[{username}] Failed to fetch watchlist page: {exc}")
+        finally:
+            _put_until_stopped(pages, None, stop_event)
+
+    producer = threading.Thread(
+        target=produce_pages, name=f"watchlist-{username}", daemon=True
     )
+    producer.start()
+
     new_tmdb_ids = []
     sync_stopped = False
-
-    while watchlist_soup is not None and not sync_stopped:
-        film_frames = watchlist_soup.find_all(
-            "div", {"data-component-class": "LazyPoster"}
-        )
-
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Submit all movie detail scrapes on the current page to the thread pool
-            future_to_endpoint = {
-                executor.submit(
-                    extract_tmdb_id_from_endpoint,
-                    str(frame["data-target-link"][1:]),
-                    proxy_manager,
-                ): frame
-                for frame in film_frames
-                if isinstance(frame, bs4.element.Tag)
-                and "data-target-link" in frame.attrs
-            }
-
-            # Create a list of futures in the order they appear on the page
-            ordered_futures = [
-                future
-                for future, frame in future_to_endpoint.items()
-                if frame in film_frames
-            ]
+    try:
+        while not sync_stopped:
+            page_futures = pages.get()
+            if page_futures is None:
+                break
 
             # Process results in order to respect the watchlist sequence
-            for future in ordered_futures:
+            for idx, future in enumerate(page_futures):
                 try:
                     tmdb_id = future.result()
                     if tmdb_id:
@@ -145,28 +435,20 @@ def get_new_watchlist_tmdb_ids(
                                 f"[{username}] Found last synced movie (TMDB ID: {tmdb_id}). Stopping scrape."
                             )
                             sync_stopped = True
+                            for pending in page_futures[idx + 1 :]:
+                                pending.cancel()
                             break  # Stop processing movies on this page
                         new_tmdb_ids.append(tmdb_id)
                 except Exception as exc:
                     logger.error(
                         f"An exception occurred while fetching a TMDB ID: {exc}"
                     )
+    finally:
+        # Cancel the speculative lookups of every prefetched page
+        stop_event.set()
+        while not pages.empty():
+            for pending in pages.get_nowait() or []:
+                pending.cancel()
+        executor.shutdown(wait=True, cancel_futures=True)
 
-        if sync_stopped:
-            break  # Stop processing further pages
-
-        next_page_link = watchlist_soup.find("a", {"class": "next"})
-        if next_page_link is not None and isinstance(next_page_link, bs4.element.Tag):
-            page_idx += 1
-            logger.info(f"[{username}] Getting watchlist page {page_idx}")
-            watchlist_page = make_letterboxd_request(
-                str(next_page_link["href"]), proxy_manager
-            )
-            if watchlist_page:
-                watchlist_soup = BeautifulSoup(watchlist_page.content, "html.parser")
-            else:
-                watchlist_soup = None
-        else:
-            watchlist_soup = None
-
-    return new_tmdb_ids
+    return WatchlistScan(new_tmdb_ids, fingerprint, new_anchors)
@@ -0,0 +1,478 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Mapping
+
+import aiohttp
+from aiohttp_socks import ProxyConnector
+
+from src.config import config
+from src.html_parser import WatchlistPage, get_html_parser
+from src.letterboxd import (
+    URL,
+    AnchorMatcher,
+    WatchlistScan,
+    _parse_tmdb_id,
+    _resolve_page_films,
+    _revalidated_body,
+    film_page_stop_pattern,
+    watchlist_anchors,
+    watchlist_fingerprint,
+)
+from src.page_cache import conditional_headers, get_page_cache
+from src.proxies import (
+    STREAM_CHUNK_SIZE,
+    ProxyManager,
+    StreamScanner,
+    describe_error,
+    get_browser_headers,
+    is_proxy_fault,
+)
+from src.rate_limiter import parse_retry_after
+from src.tmdb_cache import get_tmdb_cache
+
+logger = logging.getLogger("letterboxd-sync")
+
+
+def _build_connector(proxy_url: str | None, limit: int) -> aiohttp.BaseConnector:
+    """Builds a connection pool, tunnelled through the given HTTP or SOCKS proxy."""
+    if proxy_url is None:
+        return aiohttp.TCPConnector(limit=limit)
+
+    # socks5h means "resolve DNS through the proxy", which aiohttp-socks calls rdns
+    rdns = proxy_url.startswith("socks5h://")
+    if rdns:
+        proxy_url = "socks5://" + proxy_url[len("socks5h://") :]
+    return ProxyConnector.from_url(proxy_url, rdns=rdns, limit=limit)
+
+
+class AsyncRequestSlots:
+    """
+    Semaphore bounding async Letterboxd requests across all users. Each user's
+    scrape runs its own event loop, so a waiter is woken through its loop with
+    `call_soon_threadsafe` instead of blocking or polling.
+    """
+
+    def __init__(self, limit: int):
+        self._available = max(1, limit)
+        self._waiters: deque[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self._lock = threading.Lock()
+
+    async def acquire(self):
+        with self._lock:
+            if self._available > 0 and not self._waiters:
+                self._available -= 1
+                return
+            loop = asyncio.get_running_loop()
+            waiter = loop.create_future()
+            self._waiters.append((loop, waiter))
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                if (loop, waiter) in self._waiters:
+                    self._waiters.remove((loop, waiter))
+                    raise
+            # The slot was handed over just before the cancellation: pass it on
+            if not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                loop, waiter = self._waiters.popleft()
+                try:
+                    # The slot goes straight to the waiter, it is never made available
+                    loop.call_soon_threadsafe(self._hand_over, waiter)
+                    return
+                except RuntimeError:
+                    continue  # Its event loop is closed
+            self._available += 1
+
+    def _hand_over(self, waiter: asyncio.Future):
+        if waiter.cancelled():
+            self.release()
+        else:
+            waiter.set_result(None)
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, *exc_info: Any):
+        self.release()
+
+
+_request_slots: AsyncRequestSlots | None = None
+_request_slots_lock = threading.Lock()
+
+
+def get_async_request_slots() -> AsyncRequestSlots:
+    """
+    Returns the budget of async requests in flight across all users, set by
+    `letterboxd.async_max_global_requests`. It is separate from the thread engine's
+    `max_global_requests`, which is sized for OS threads.
+    """
+    global _request_slots
+    with _request_slots_lock:
+        if _request_slots is None:
+            letterboxd_config = config.get("letterboxd", {})
+            _request_slots = AsyncRequestSlots(
+                letterboxd_config.get(
+                    "async_max_global_requests",
+                    letterboxd_config.get("max_concurrent_requests", 5),
+                )
+            )
+        return _request_slots
+
+
+def reset_async_request_slots():
+    """Rebuilds the async request budget on next use, e.g. after a configuration reload."""
+    global _request_slots
+    with _request_slots_lock:
+        _request_slots = None
+
+
+class AsyncLetterboxdClient:
+    """
+    Asyncio Letterboxd client with a global and a per-proxy concurrency limit.
+    Keeps one connection pool per proxy for the lifetime of the client.
+    """
+
+    def __init__(
+        self,
+        proxy_manager: ProxyManager,
+        max_concurrent_requests: int,
+        per_proxy_concurrency: int,
+        timeout: float = 20,
+    ):
+        self.proxy_manager = proxy_manager
+        self.per_proxy_concurrency = per_proxy_concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._global_semaphore = asyncio.Semaphore(max_concurrent_requests)
+        self._proxy_semaphores: dict[str | None, asyncio.Semaphore] = {}
+        self._sessions: dict[str | None, aiohttp.ClientSession] = {}
+
+    async def __aenter__(self) -> "AsyncLetterboxdClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any):
+        await self.close()
+
+    async def close(self):
+        """Closes every connection pool opened by this client."""
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions.clear()
+
+    def _session_for(self, proxy_url: str | None) -> aiohttp.ClientSession:
+        if proxy_url not in self._sessions:
+            self._sessions[proxy_url] = aiohttp.ClientSession(
+                connector=_build_connector(proxy_url, self.per_proxy_concurrency),
+                timeout=self.timeout,
+            )
+            self._proxy_semaphores[proxy_url] = asyncio.Semaphore(
+                self.per_proxy_concurrency
+            )
+        return self._sessions[proxy_url]
+
+    async def _get(
+        self,
+        url: str,
+        proxy_url: str | None,
+        stop_at: re.Pattern[bytes] | None = None,
+        extra_headers: dict[str, str] | None = None,
+    ) -> tuple[tuple[int, Mapping[str, str], bytes], float]:
+        """
+        Returns the status, headers and body of a GET, read up to `stop_at` if given,
+        and the time the server took to answer (excluding the waits for a slot).
+        """
+        session = self._session_for(proxy_url)
+        headers = get_browser_headers()
+        if extra_headers:
+            headers.update(extra_headers)
+        # Also honour the process-wide budget shared with other users' scrapes
+        async with (
+            self._global_semaphore,
+            self._proxy_semaphores[proxy_url],
+            get_async_request_slots(),
+        ):
+            started = time.monotonic()
+            async with session.get(url, headers=headers) as response:
+                latency = time.monotonic() - started
+                response.raise_for_status()
+                if stop_at is None:
+                    body = await response.read()
+                    return (response.status, response.headers, body), latency
+
+                # Stream the body and drop the connection once the pattern is read
+                scanner = StreamScanner(stop_at)
+                async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                    if scanner.feed(chunk):
+                        response.close()
+                        break
+                return (response.status, response.headers, scanner.content), latency
+
+    async def _limited_get(
+        self,
+        url: str,
+        proxy: dict[str, str] | None,
+        stop_at: re.Pattern[bytes] | None = None,
+        extra_headers: dict[str, str] | None = None,
+    ) -> tuple[int, Mapping[str, str], bytes]:
+        """
+        GET through `proxy`, waiting (without blocking the loop) for the rate limiter.
+        Reports the time the server took to answer as the proxy's latency.
+        """
+        rate_limiter = self.proxy_manager.rate_limiter
+        await asyncio.sleep(rate_limiter.reserve(proxy))
+
+        proxy_url = proxy.get("https", proxy.get("http")) if proxy else None
+        try:
+            response, latency = await self._get(url, proxy_url, stop_at, extra_headers)
+        except aiohttp.ClientResponseError as e:
+            if e.status == 429:
+                retry_after = e.headers.get("Retry-After") if e.headers else None
+                rate_limiter.record_throttled(proxy, parse_retry_after(retry_after))
+            raise
+
+        rate_limiter.record_success(proxy)
+        self.proxy_manager.record_success(proxy, latency)
+        return response
+
+    async def fetch(
+        self,
+        endpoint: str,
+        retries: int = 3,
+        stop_at: re.Pattern[bytes] | None = None,
+        conditional: bool = False,
+    ) -> bytes | None:
+        """
+        Async counterpart of `make_letterboxd_request`.
+        Returns the response body (read up to `stop_at` if given), or None on persistent failure.
+        With `conditional`, the page is revalidated against the page cache like
+        `fetch_watchlist_page` does.
+        """
+        url = URL + endpoint
+        # The caches are sqlite databases: their I/O runs off the event loop
+        page_cache = get_page_cache() if conditional else None
+        cached = (
+            await asyncio.to_thread(page_cache.lookup, url)
+            if page_cache is not None
+            else None
+        )
+        extra_headers = conditional_headers(cached)
+
+        response = await self._fetch_response(url, retries, stop_at, extra_headers)
+        if response is None:
+            return None
+        status, headers, body = response
+        if not conditional:
+            return body
+        return await asyncio.to_thread(
+            _revalidated_body, page_cache, url, cached, status, headers, body
+        )
+
+    async def _fetch_response(
+        self,
+        url: str,
+        retries: int,
+        stop_at: re.Pattern[bytes] | None,
+        extra_headers: dict[str, str],
+    ) -> tuple[int, Mapping[str, str], bytes] | None:
+        """Sends the GET with retries and direct fallback; None on persistent failure."""
+        for attempt in range(retries):
+            proxy = self.proxy_manager.get_proxy()
+            proxy_url = proxy.get("https", proxy.get("http")) if proxy else None
+            try:
+                return await self._limited_get(url, proxy, stop_at, extra_headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                status = e.status if isinstance(e, aiohttp.ClientResponseError) else None
+                if is_proxy_fault(status):
+                    self.proxy_manager.record_failure(proxy, describe_error(e, status))
+                logger.warning(
+                    f"Request to {url} failed with proxy {proxy_url or 'none'} (attempt {attempt + 1}/{retries}). Error: {e}"
+                )
+                if proxy_url is None or not self.proxy_manager.allow_fallback:
+                    continue
+
+            logger.info(f"Attempting direct connection to {url}")
+            try:
+                return await self._limited_get(url, None, stop_at, extra_headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                logger.error(f"Direct connection also failed: {e}")
+
+        logger.error(f"Failed to make request to {url} after {retries} retries.")
+        return None
+
+    async def extract_tmdb_id(self, endpoint: str) -> str | None:
+        """Async counterpart of `extract_tmdb_id_from_endpoint`."""
+        cache = get_tmdb_cache()
+        if cache is not None:
+            hit, tmdb_id = await asyncio.to_thread(cache.lookup, endpoint)
+            if hit:
+                return tmdb_id
+
+        content = await self.fetch(endpoint, stop_at=film_page_stop_pattern())
+        if content is None:
+            return None
+
+        tmdb_id, reason = await asyncio.to_thread(_parse_tmdb_id, content, endpoint)
+        if cache is not None:
+            await asyncio.to_thread(cache.store, endpoint, tmdb_id, reason)
+        return tmdb_id
+
+
+def _parse_watchlist_page(
+    content: bytes, anchor_matcher: AnchorMatcher
+) -> tuple[WatchlistPage, list[tuple[str, bool, str | None]], str | None]:
+    """
+    Parses a watchlist page. Returns the whole page, the fast-path results of
+    the films preceding the last sync, and the anchor to stop at (None if there is none).
+    """
+    watchlist_page = get_html_parser().parse_watchlist(content)
+    new_films_page, anchor = anchor_matcher.cut(watchlist_page)
+    return watchlist_page, _resolve_page_films(new_films_page), anchor
+
+
+async def _resolved(tmdb_id: str | None) -> str | None:
+    return tmdb_id
+
+
+async def get_new_watchlist_tmdb_ids_async(
+    username: str,
+    proxy_manager: ProxyManager,
+    max_workers: int,
+    latest_synced_tmdb_id: str | None,
+    page_lookahead: int = 2,
+    per_proxy_concurrency: int = 2,
+    known_fingerprint: str | None = None,
+    anchors: list[str] | None = None,
+) -> WatchlistScan:
+    """
+    Asyncio version of `get_new_watchlist_tmdb_ids`.
+    Film lookups run as tasks on a single event loop instead of OS threads,
+    bounded by `max_workers` overall and `per_proxy_concurrency` per proxy.
+    """
+    logger.info(
+        f"[{username}] Starting async incremental watchlist scrape with {max_workers} concurrent requests..."
+    )
+    # Only used by the producer, one page at a time
+    anchor_matcher = AnchorMatcher(anchors or [])
+    if anchors:
+        logger.info(
+            f"[{username}] Will stop where the {len(anchors)} films at the top of the watchlist during the last sync are found."
+        )
+    if latest_synced_tmdb_id:
+        logger.info(
+            f"[{username}] Will stop when TMDB ID '{latest_synced_tmdb_id}' is found."
+        )
+
+    async with AsyncLetterboxdClient(
+        proxy_manager, max_workers, per_proxy_concurrency
+    ) as client:
+        content = await client.fetch(f"{username}/watchlist/", conditional=True)
+        if content is None:
+            logger.error(
+                f"[{username}] Could not fetch initial watchlist page. Aborting."
+            )
+            return WatchlistScan([], None, [])
+
+        first_page = await asyncio.to_thread(
+            _parse_watchlist_page, content, anchor_matcher
+        )
+        fingerprint = watchlist_fingerprint(first_page[0])
+        new_anchors = watchlist_anchors(first_page[0])
+        if known_fingerprint is not None and fingerprint == known_fingerprint:
+            logger.info(
+                f"[{username}] Watchlist unchanged since the last sync. Skipping scrape."
+            )
+            return WatchlistScan([], fingerprint, new_anchors)
+
+        pages: asyncio.Queue = asyncio.Queue(maxsize=max(1, page_lookahead))
+
+        async def produce_pages(parsed_page):
+            page_idx = 1
+            try:
+                while parsed_page is not None:
+                    watchlist_page, films, anchor = parsed_page
+                    page_tasks = [
+                        asyncio.create_task(
+                            _resolved(tmdb_id)
+                            if resolved
+                            else client.extract_tmdb_id(endpoint)
+                        )
+                        for endpoint, resolved, tmdb_id in films
+                    ]
+                    await pages.put(page_tasks)
+
+                    if anchor is not None:
+                        logger.info(
+                            f"[{username}] Found film from the last sync ({anchor}). Stopping scrape."
+                        )
+                        break
+                    if watchlist_page.next_href is None:
+                        break
+                    page_idx += 1
+                    logger.info(f"[{username}] Getting watchlist page {page_idx}")
+                    content = await client.fetch(
+                        watchlist_page.next_href, conditional=True
+                    )
+                    parsed_page = (
+                        await asyncio.to_thread(
+                            _parse_watchlist_page, content, anchor_matcher
+                        )
+                        if content is not None
+                        else None
+                    )
+            except Exception as exc:
+                logger.error(f"[{username}] Failed to fetch watchlist page: {exc}")
+            # Not in a finally block: a cancelled producer must not block on a full queue
+            await pages.put(None)
+
+        producer = asyncio.create_task(produce_pages(first_page))
+
+        new_tmdb_ids = []
+        sync_stopped = False
+        try:
+            while not sync_stopped:
+                page_tasks = await pages.get()
+                if page_tasks is None:
+                    break
+
+                # Process results in order to respect the watchlist sequence
+                for idx, task in enumerate(page_tasks):
+                    try:
+                        tmdb_id = await task
+                        if tmdb_id:
+                            if tmdb_id == latest_synced_tmdb_id:
+                                logger.info(
+                                    f"[{username}] Found last synced movie (TMDB ID: {tmdb_id}). Stopping scrape."
+                                )
+                                sync_stopped = True
+                                for pending in page_tasks[idx + 1 :]:
+                                    pending.cancel()
+                                break
+                            new_tmdb_ids.append(tmdb_id)
+                    except Exception as exc:
+                        logger.error(
+                            f"An exception occurred while fetching a TMDB ID: {exc}"
+                        )
+        finally:
+            # Cancel the producer and the speculative lookups of every prefetched page
+            producer.cancel()
+            while not pages.empty():
+                for pending in pages.get_nowait() or []:
+                    pending.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
+    return WatchlistScan(new_tmdb_ids, fingerprint, new_anchors)
+
+
+def scrape_watchlist_async(*args: Any, **kwargs: Any) -> WatchlistScan:
+    """Runs `get_new_watchlist_tmdb_ids_async` to completion from synchronous code."""
+    return asyncio.run(get_new_watchlist_tmdb_ids_async(*args, **kwargs))
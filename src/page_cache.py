@@ -0,0 +1,93 @@
+import sqlite3
+import threading
+import time
+import zlib
+from typing import NamedTuple
+
+from src.config import config
+from src.shared_cache import SharedCache
+from src.state_manager import data_file_path
+
+PAGE_CACHE_PATH = data_file_path("PAGE_CACHE_PATH", "page_cache.db")
+
+
+class CachedPage(NamedTuple):
+    etag: str | None
+    last_modified: str | None
+    body: bytes
+
+
+class PageCache:
+    """
+    Persistent HTTP cache for Letterboxd pages: the last body of each URL with
+    its ETag / Last-Modified validators, so pages can be revalidated with a
+    conditional request and served from disk on 304 Not Modified.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pages (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    body BLOB NOT NULL,
+                    fetched_at REAL NOT NULL
+                )
+                """
+            )
+
+    def lookup(self, url: str) -> CachedPage | None:
+        """Returns the cached page for `url`, or None if it was never stored."""
+        with self.lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, body FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, body = row
+        return CachedPage(etag, last_modified, zlib.decompress(body))
+
+    def store(
+        self, url: str, etag: str | None, last_modified: str | None, body: bytes
+    ):
+        """Stores the latest body of `url`. Pages without validators are not worth keeping."""
+        if not etag and not last_modified:
+            return
+        with self.lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (url, etag, last_modified, body, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                (url, etag, last_modified, zlib.compress(body), time.time()),
+            )
+
+
+def conditional_headers(cached: CachedPage | None) -> dict[str, str]:
+    """Returns the If-None-Match / If-Modified-Since headers revalidating a cached page."""
+    headers = {}
+    if cached is not None:
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+    return headers
+
+
+_page_cache = SharedCache("Letterboxd page cache", PAGE_CACHE_PATH, PageCache)
+
+
+def get_page_cache() -> PageCache | None:
+    """
+    Returns the process-wide page cache, or None if it is disabled or unavailable.
+    """
+    if not config.get("letterboxd", {}).get("page_cache", {}).get("enabled", True):
+        return None
+    return _page_cache.get()
+
+
+def reset_page_cache():
+    """Reopens the page cache on next use, e.g. after a configuration reload."""
+    _page_cache.reset()
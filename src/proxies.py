@@ -1,16 +1,25 @@
 import logging
 import random
+import re
+from concurrent.futures import ThreadPoolExecutor
 import time
 import threading
+from collections import deque
+from contextlib import nullcontext
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Any
 import socket
 from urllib.parse import urlparse
 
 from src.exceptions import RequestException
+from src.rate_limiter import RateLimiter, parse_retry_after
 
 logger = logging.getLogger("letterboxd-sync")
 
+# Bytes read at a time from streamed responses
+STREAM_CHUNK_SIZE = 16 * 1024
+
 USER_AGENTS = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36",
@@ -51,19 +60,90 @@ def get_browser_headers() -> dict[str, str]:
     }
 
 
+def proxy_key(proxy: dict[str, str] | None) -> str:
+    """Returns the URL identifying a proxy, or 'direct' when no proxy is used."""
+    if not proxy:
+        return "direct"
+    return proxy.get("https", proxy.get("http", "unknown"))
+
+
+class ProxyStats:
+    """
+    Rolling health statistics of a single proxy, used to score it for selection.
+    """
+
+    # Weight of the newest sample in the exponentially weighted latency average
+    LATENCY_ALPHA = 0.3
+
+    def __init__(self):
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.avg_latency: float | None = None
+        self.benched_until = 0.0
+        self.recent_errors: deque[str] = deque(maxlen=10)
+
+    @property
+    def success_rate(self) -> float:
+        # Laplace smoothing so unused proxies start at a neutral 50%
+        return (self.successes + 1) / (self.successes + self.failures + 2)
+
+    @property
+    def score(self) -> float:
+        """Higher is better: reliable, fast proxies get picked more often."""
+        latency = self.avg_latency if self.avg_latency is not None else 1.0
+        return self.success_rate**2 / max(latency, 0.05)
+
+    def is_benched(self, now: float) -> bool:
+        return self.benched_until > now
+
+    def record_success(self, latency: float):
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.benched_until = 0.0
+        if self.avg_latency is None:
+            self.avg_latency = latency
+        else:
+            self.avg_latency += self.LATENCY_ALPHA * (latency - self.avg_latency)
+
+    def record_failure(self, error: str, bench_for: float):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.recent_errors.append(error)
+        self.benched_until = time.monotonic() + bench_for
+
+
 class ProxyManager:
     """
     Manages loading, formatting, and rotating proxies from configuration.
+    Proxies are picked by health score; failing ones are benched with exponential backoff.
     """
 
     def __init__(self, config: dict[str, Any]):
         self.proxies: list[dict[str, str]] = []
+        # Proxies that failed validation, periodically re-tested in the background
+        self.dead_proxies: list[dict[str, str]] = []
         self.current_index = 0
         self.lock = threading.Lock()
         self.validate_on_startup = config.get("validate_proxies_on_startup", True)
         self.allow_fallback = config.get("allow_direct_fallback", True)
+        self.validation_workers = config.get("proxy_validation_workers", 50)
+        self.selection = config.get("proxy_selection", "weighted")
+        self.bench_base = config.get("proxy_bench_base_seconds", 30)
+        self.bench_max = config.get("proxy_bench_max_seconds", 1800)
+        self.stats: dict[str, ProxyStats] = {}
+        # Spaces requests per proxy and per egress IP, shared by every user
+        self.rate_limiter = RateLimiter.from_config(config.get("rate_limit", {}))
+        self._stop_event = threading.Event()
+        configure_sessions(
+            config.get("max_global_requests", config.get("max_concurrent_requests", 10))
+        )
         self._load_proxies(config)
 
+        revalidate_interval = config.get("proxy_revalidate_interval", 30)
+        if self.validate_on_startup and revalidate_interval:
+            self._start_revalidation(revalidate_interval * 60)
+
     def _load_proxies(self, config: dict[str, Any]):
         """
         Loads proxies from a file or a list based on the provided config.
@@ -147,27 +227,44 @@ class ProxyManager:
             logger.debug(f"Proxy connectivity test failed for {proxy_dict}: {e}")
             return False
 
+    def _test_proxies(
+        self, proxies: list[dict[str, str]]
+    ) -> tuple[list[dict[str, str]], list[dict[str, str]]]:
+        """
+        Test the connectivity of several proxies concurrently.
+        Returns the (working, unreachable) proxies, each in their original order.
+        """
+        if not proxies:
+            return [], []
+
+        workers = max(1, min(self.validation_workers, len(proxies)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(self._test_proxy_connectivity, proxies))
+
+        working = [proxy for proxy, ok in zip(proxies, results) if ok]
+        unreachable = [proxy for proxy, ok in zip(proxies, results) if not ok]
+        return working, unreachable
+
     def _validate_proxies(self):
         """
-        Test all loaded proxies and remove unreachable ones.
+        Test all loaded proxies and set aside unreachable ones.
         """
         if not self.proxies:
             return
-            
+
         logger.info("Testing proxy connectivity...")
-        working_proxies = []
-        
-        for proxy in self.proxies:
-            if self._test_proxy_connectivity(proxy):
-                working_proxies.append(proxy)
-            else:
-                proxy_url = proxy.get("https", proxy.get("http", "unknown"))
-                logger.warning(f"Proxy {proxy_url} is not reachable, removing from list")
-        
+        working_proxies, dead_proxies = self._test_proxies(self.proxies)
+        for proxy in dead_proxies:
+            proxy_url = proxy.get("https", proxy.get("http", "unknown"))
+            logger.warning(f"Proxy {proxy_url} is not reachable, removing from list")
+
         original_count = len(self.proxies)
-        self.proxies = working_proxies
+        with self.lock:
+            self.proxies = working_proxies
+            self.dead_proxies = dead_proxies
+            self.current_index = 0
         working_count = len(self.proxies)
-        
+
         if working_count == 0:
             logger.error("No working proxies found! Requests will be made without proxies.")
         elif working_count < original_count:
@@ -175,76 +272,379 @@ class ProxyManager:
         else:
             logger.info(f"All {working_count} proxies are working.")
 
+    def _revalidate_dead_proxies(self):
+        """Re-test unreachable proxies and bring the working ones back into rotation."""
+        with self.lock:
+            dead_proxies = list(self.dead_proxies)
+        if not dead_proxies:
+            return
+
+        revived, still_dead = self._test_proxies(dead_proxies)
+        with self.lock:
+            self.proxies.extend(revived)
+            self.dead_proxies = still_dead
+        if revived:
+            logger.info(
+                f"{len(revived)} previously unreachable proxies are working again ({len(self.proxies)} in rotation)."
+            )
+
+    def _start_revalidation(self, interval: float):
+        """Starts a background thread re-testing dead proxies every `interval` seconds."""
+
+        def revalidate_loop():
+            while not self._stop_event.wait(interval):
+                try:
+                    self._revalidate_dead_proxies()
+                except Exception as e:
+                    logger.error(f"Proxy revalidation failed: {e}")
+
+        threading.Thread(
+            target=revalidate_loop, name="proxy-revalidation", daemon=True
+        ).start()
+
+    def close(self):
+        """Stops the background revalidation."""
+        self._stop_event.set()
+
+    def _stats_for(self, proxy: dict[str, str]) -> ProxyStats:
+        key = proxy_key(proxy)
+        if key not in self.stats:
+            self.stats[key] = ProxyStats()
+        return self.stats[key]
+
     def get_proxy(self) -> dict[str, str] | None:
         """
-        Returns the next proxy in the list in a thread-safe, round-robin fashion.
+        Returns a proxy in a thread-safe fashion, according to `proxy_selection`:
+        'weighted' (random, weighted by score), 'least_latency' or 'round_robin'.
+        Benched proxies are skipped; if all are benched, the one recovering first is used.
         Returns None if no proxies are loaded.
         """
-        if not self.proxies:
-            return None
-        
         with self.lock:
-            proxy = self.proxies[self.current_index]
-            self.current_index = (self.current_index + 1) % len(self.proxies)
-            return proxy
+            if not self.proxies:
+                return None
 
+            if self.selection == "round_robin":
+                self.current_index %= len(self.proxies)
+                proxy = self.proxies[self.current_index]
+                self.current_index = (self.current_index + 1) % len(self.proxies)
+                return proxy
 
-# Global session for connection reuse and cookie persistence
-_session = None
+            now = time.monotonic()
+            available = [
+                proxy
+                for proxy in self.proxies
+                if not self._stats_for(proxy).is_benched(now)
+            ]
+            if not available:
+                return min(self.proxies, key=lambda p: self._stats_for(p).benched_until)
+
+            if self.selection == "least_latency":
+                # Untested proxies report no latency and get tried first
+                return min(
+                    available, key=lambda p: self._stats_for(p).avg_latency or 0.0
+                )
+
+            weights = [self._stats_for(proxy).score for proxy in available]
+            return random.choices(available, weights=weights)[0]
+
+    def record_success(self, proxy: dict[str, str] | None, latency: float):
+        """Records a successful request made through `proxy`."""
+        if not proxy:
+            return
+        with self.lock:
+            self._stats_for(proxy).record_success(latency)
+
+    def record_failure(self, proxy: dict[str, str] | None, error: str):
+        """Records a failed request and benches the proxy with exponential backoff."""
+        if not proxy:
+            return
+        with self.lock:
+            stats = self._stats_for(proxy)
+            bench_for = min(
+                self.bench_base * 2**stats.consecutive_failures, self.bench_max
+            )
+            stats.record_failure(error, bench_for)
+        logger.debug(f"Proxy {proxy_key(proxy)} benched for {bench_for:.0f}s ({error})")
 
+    def get_stats(self) -> list[dict[str, Any]]:
+        """Returns per-proxy health statistics, worst score first."""
+        now = time.monotonic()
+        with self.lock:
+            stats = [
+                {
+                    "proxy": key,
+                    "score": round(proxy_stats.score, 3),
+                    "success_rate": round(proxy_stats.success_rate, 3),
+                    "successes": proxy_stats.successes,
+                    "failures": proxy_stats.failures,
+                    "avg_latency": proxy_stats.avg_latency,
+                    "benched": proxy_stats.is_benched(now),
+                    "recent_errors": list(proxy_stats.recent_errors),
+                }
+                for key, proxy_stats in self.stats.items()
+            ]
+        return sorted(stats, key=lambda entry: entry["score"])
 
-def get_session() -> requests.Session:
+    def log_stats(self, limit: int = 5):
+        """Logs the least healthy proxies, as candidates for removal."""
+        stats = [entry for entry in self.get_stats() if entry["failures"]]
+        if not stats:
+            return
+        logger.info(f"{len(stats)} proxies had failures. Least healthy:")
+        for entry in stats[:limit]:
+            logger.info(
+                f"  {entry['proxy']}: score={entry['score']}, success_rate={entry['success_rate']:.0%}, "
+                f"failures={entry['failures']}, benched={entry['benched']}, recent_errors={entry['recent_errors']}"
+            )
+
+
+# Process-wide proxy pool, loaded and validated once and shared by all users
+_proxy_manager: ProxyManager | None = None
+_proxy_manager_lock = threading.Lock()
+
+
+def get_proxy_manager(config: dict[str, Any]) -> ProxyManager:
+    """
+    Returns the shared ProxyManager, creating it from the letterboxd config on first use.
+    """
+    global _proxy_manager
+    with _proxy_manager_lock:
+        if _proxy_manager is None:
+            _proxy_manager = ProxyManager(config)
+        return _proxy_manager
+
+
+def reset_proxy_manager():
+    """Discards the shared ProxyManager so it is rebuilt from the current config."""
+    global _proxy_manager
+    with _proxy_manager_lock:
+        if _proxy_manager is not None:
+            _proxy_manager.close()
+        _proxy_manager = None
+
+    # Drop the per-proxy sessions too, so they pick up the new pool size
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+# One session per proxy (plus one for direct connections), for connection reuse
+# and sticky cookies per egress IP
+_sessions: dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+_session_pool_size = 10
+
+
+def configure_sessions(pool_size: int):
+    """
+    Sets the connection pool size of the per-proxy sessions.
+    It should match the configured request concurrency so threads never wait for,
+    or throw away, pooled connections. Applies to sessions created afterwards.
     """
-    Returns a persistent session with browser-like configuration.
+    global _session_pool_size
+    _session_pool_size = max(1, pool_size)
+
+
+def get_session(proxy: dict[str, str] | None = None) -> requests.Session:
+    """
+    Returns the persistent session for a proxy, with browser-like configuration.
+    Keep-alive connections (and their TLS sessions) through that proxy are reused
+    across requests and threads.
+    """
+    key = proxy_key(proxy)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=4, pool_maxsize=_session_pool_size
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            # Route every request of this session through its proxy
+            session.proxies = dict(proxy) if proxy else {}
+            # Set some default headers that will be used for all requests
+            session.headers.update(
+                {
+                    "User-Agent": random.choice(USER_AGENTS),
+                    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+                    "Accept-Language": "en-US,en;q=0.5",
+                    "Accept-Encoding": "gzip, deflate",
+                    "DNT": "1",
+                    "Connection": "keep-alive",
+                    "Upgrade-Insecure-Requests": "1",
+                }
+            )
+            _sessions[key] = session
+        return session
+
+
+def describe_error(error: Exception, status: int | None) -> str:
+    """
+    Short description of a request error for proxy health tracking (e.g. 'HTTP 429'),
+    from its HTTP status when there was a response. Used by both scraper engines.
     """
-    global _session
-    if _session is None:
-        _session = requests.Session()
-        # Set some default headers that will be used for all requests
-        _session.headers.update(
-            {
-                "User-Agent": random.choice(USER_AGENTS),
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-                "Accept-Language": "en-US,en;q=0.5",
-                "Accept-Encoding": "gzip, deflate",
-                "DNT": "1",
-                "Connection": "keep-alive",
-                "Upgrade-Insecure-Requests": "1",
-            }
+    if status is not None:
+        return f"HTTP {status}"
+    return type(error).__name__
+
+
+class StreamScanner:
+    """
+    Accumulates a response body chunk by chunk and tells when `pattern` has been
+    seen, so the rest of the body does not have to be downloaded. The tail of the
+    data already scanned is scanned again, so matches split across chunks are found.
+    """
+
+    def __init__(self, pattern: re.Pattern[bytes], overlap: int = 2048):
+        self.pattern = pattern
+        self.overlap = overlap
+        self.buffer = bytearray()
+        self.found = False
+
+    def feed(self, chunk: bytes) -> bool:
+        """Adds a chunk and returns True once the pattern is in the data read so far."""
+        start = max(0, len(self.buffer) - self.overlap)
+        self.buffer += chunk
+        self.found = self.pattern.search(self.buffer, start) is not None
+        return self.found
+
+    @property
+    def content(self) -> bytes:
+        return bytes(self.buffer)
+
+
+# Statuses by which Letterboxd blocks or throttles the proxy itself. Other HTTP
+# errors (404 for a removed film, 5xx) are the origin server's doing.
+PROXY_FAULT_STATUSES = (403, 429)
+
+
+def is_proxy_fault(status: int | None) -> bool:
+    """
+    Whether a failed request should count against its proxy: no response at all
+    (connection error, timeout) or a blocking / throttling status.
+    """
+    return status is None or status in PROXY_FAULT_STATUSES
+
+
+def _fetch(
+    url: str,
+    proxy: dict | None,
+    headers: dict[str, str],
+    rate_limiter: RateLimiter | None,
+    stop_at: re.Pattern[bytes] | None = None,
+    request_slots: threading.Semaphore | None = None,
+) -> requests.Response:
+    """
+    Sends a single GET through `proxy` (None for direct), waiting for the rate limiter
+    first and feeding 429 responses back into it. A slot of `request_slots` is only
+    held while the request is in flight, not during the rate limiter wait.
+
+    With `stop_at`, the body is streamed and the connection closed as soon as the
+    pattern has been read; the response content is then the body read up to that point.
+    """
+    if rate_limiter is not None:
+        rate_limiter.acquire(proxy)
+
+    with request_slots if request_slots is not None else nullcontext():
+        return _send(url, proxy, headers, rate_limiter, stop_at)
+
+
+def _send(
+    url: str,
+    proxy: dict | None,
+    headers: dict[str, str],
+    rate_limiter: RateLimiter | None,
+    stop_at: re.Pattern[bytes] | None,
+) -> requests.Response:
+    """Sends the GET of `_fetch` once the rate limiter has let it go."""
+    try:
+        response = get_session(proxy).get(
+            url,
+            timeout=20,
+            proxies=proxy,
+            headers=headers,
+            allow_redirects=True,
+            stream=stop_at is not None,
         )
-    return _session
+        response.raise_for_status()  # Raises an HTTPError for bad responses (4xx or 5xx)
+    except requests.exceptions.HTTPError as e:
+        if rate_limiter is not None and e.response is not None and e.response.status_code == 429:
+            rate_limiter.record_throttled(
+                proxy, parse_retry_after(e.response.headers.get("Retry-After"))
+            )
+        if e.response is not None:
+            e.response.close()
+        raise
+
+    if stop_at is not None:
+        scanner = StreamScanner(stop_at)
+        try:
+            for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                if scanner.feed(chunk):
+                    break
+        finally:
+            response.close()
+        # Expose what was read as the body, like a regular (non-streamed) response
+        response._content = scanner.content
+
+    if rate_limiter is not None:
+        rate_limiter.record_success(proxy)
+    return response
 
 
 def make_request(
-    url: str, proxy: dict | None = None, delay_range: tuple[float, float] = (0.5, 2.0), allow_fallback: bool = True
+    url: str,
+    proxy: dict | None = None,
+    delay_range: tuple[float, float] = (0.5, 2.0),
+    allow_fallback: bool = True,
+    proxy_manager: ProxyManager | None = None,
+    stop_at: re.Pattern[bytes] | None = None,
+    extra_headers: dict[str, str] | None = None,
+    request_slots: threading.Semaphore | None = None,
 ) -> requests.Response:
     """
     Makes a GET request with anti-detection measures, optionally using a provided proxy.
 
+    Requests are spaced by the proxy manager's rate limiter when one is given;
+    otherwise a random delay in `delay_range` is applied before the request.
+
     Args:
         url: The URL to request
         proxy: Optional proxy configuration
-        delay_range: Tuple of (min_delay, max_delay) in seconds for random delays
+        delay_range: Tuple of (min_delay, max_delay) in seconds for random delays without a rate limiter
         allow_fallback: If True, fallback to direct connection if proxy fails
+        proxy_manager: Optional proxy manager providing the rate limiter and notified of the proxy's latency and failures
+        stop_at: Optional pattern; the body is streamed and only read until it is found
+        extra_headers: Optional headers added to the browser headers (e.g. conditional request headers)
+        request_slots: Optional semaphore bounding requests in flight, taken after the rate limiter wait
     """
-    # Add random delay to avoid appearing too automated
-    delay = random.uniform(delay_range[0], delay_range[1])
-    time.sleep(delay)
-
-    session = get_session()
+    rate_limiter = proxy_manager.rate_limiter if proxy_manager is not None else None
+    if rate_limiter is None:
+        # Add random delay to avoid appearing too automated
+        delay = random.uniform(delay_range[0], delay_range[1])
+        time.sleep(delay)
 
     # Get fresh browser headers for each request
     headers = get_browser_headers()
+    if extra_headers:
+        headers.update(extra_headers)
 
     # First try with proxy if provided
     if proxy:
         try:
-            response = session.get(
-                url, timeout=20, proxies=proxy, headers=headers, allow_redirects=True
-            )
-            response.raise_for_status()  # Raises an HTTPError for bad responses (4xx or 5xx)
+            response = _fetch(url, proxy, headers, rate_limiter, stop_at, request_slots)
+            if proxy_manager is not None:
+                # Time from sending the request to its response headers, without
+                # the rate limiter and request slot waits
+                proxy_manager.record_success(proxy, response.elapsed.total_seconds())
             return response
         except requests.exceptions.RequestException as e:
+            response = getattr(e, "response", None)
+            status = response.status_code if response is not None else None
+            if proxy_manager is not None and is_proxy_fault(status):
+                proxy_manager.record_failure(proxy, describe_error(e, status))
             proxy_url = proxy.get("https", proxy.get("http", "unknown"))
             logger.warning(f"Request via proxy {proxy_url} failed: {e}")
             
@@ -252,10 +652,7 @@ def make_request(
             if allow_fallback:
                 logger.info(f"Attempting direct connection to {url}")
                 try:
-                    response = session.get(
-                        url, timeout=20, proxies=None, headers=headers, allow_redirects=True
-                    )
-                    response.raise_for_status()
+                    response = _fetch(url, None, headers, rate_limiter, stop_at, request_slots)
                     logger.info(f"Direct connection to {url} successful")
                     return response
                 except requests.exceptions.RequestException as fallback_e:
@@ -266,10 +663,6 @@ def make_request(
     else:
         # No proxy provided, make direct request
         try:
-            response = session.get(
-                url, timeout=20, proxies=None, headers=headers, allow_redirects=True
-            )
-            response.raise_for_status()  # Raises an HTTPError for bad responses (4xx or 5xx)
-            return response
+            return _fetch(url, None, headers, rate_limiter, stop_at, request_slots)
         except requests.exceptions.RequestException as e:
             raise RequestException(f"Unable to make request to {url}: {e}") from e
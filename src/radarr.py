@@ -1,8 +1,10 @@
 from typing import TypedDict
+import threading
 import requests
 
 from requests.exceptions import JSONDecodeError
 from src.exceptions import RadarrException
+from src.http_client import ServiceSession
 from src.logger import setup_logger
 
 
@@ -20,12 +22,26 @@ class RadarrState(TypedDict):
 
 
 class RadarrClient:
-    def __init__(self, url: str, api_key: str):
+    def __init__(
+        self,
+        url: str,
+        api_key: str,
+        max_concurrent_requests: int = 4,
+        timeout: float = 20,
+        retries: int = 3,
+    ):
         if not url.endswith("/api/v3"):
             url = url.rstrip("/") + "/api/v3"
 
         self.base_url = url
-        self.headers = {"X-Api-Key": api_key}
+        self.http = ServiceSession(
+            {"X-Api-Key": api_key}, max_concurrent_requests, timeout, retries
+        )
+        # Snapshot of the local Radarr library indexed by TMDB ID, loaded once per cycle
+        self._library: dict[int, dict] | None = None
+        # Set when loading the snapshot failed, so the cycle doesn't retry it for every movie
+        self._library_failed = False
+        self._library_lock = threading.Lock()
         self.logger = setup_logger()
 
         self.logger.info(f"RadarrClient initialized with base URL: {self.base_url}")
@@ -37,7 +53,7 @@ class RadarrClient:
         """Test the connection to Radarr server."""
         url = self.base_url + "/system/status"
         try:
-            response = requests.get(url, headers=self.headers, timeout=10)
+            response = self.http.request("GET", url)
             if response.status_code != 200:
                 raise RadarrException(
                     f"Failed to connect to Radarr server: HTTP {response.status_code}"
@@ -45,17 +61,93 @@ class RadarrClient:
         except requests.exceptions.RequestException as e:
             raise RadarrException(f"Unable to connect to Radarr server: {e}")
 
+    @staticmethod
+    def _to_state(movie_data: dict) -> RadarrState:
+        """Converts a Radarr movie resource into a RadarrState."""
+        return {
+            "hasFile": bool(movie_data.get("hasFile"))
+            or movie_data.get("movieFile") is not None,
+            "monitored": movie_data.get("monitored", False),
+            "name": movie_data.get("title"),
+            "tmdbId": movie_data.get("tmdbId"),
+            "productionYear": movie_data.get("year"),
+            "is_animation": "Animation" in movie_data.get("genres", []),
+        }
+
+    def _get_library(self) -> dict[int, dict] | None:
+        """
+        Returns the local library snapshot, loading it with a single GET /movie if needed.
+        Returns None if the library can't be loaded; the failure is remembered
+        until `invalidate_library`, and lookups go through /movie/lookup meanwhile.
+        """
+        with self._library_lock:
+            if self._library is not None or self._library_failed:
+                return self._library
+
+            url = f"{self.base_url}/movie"
+            try:
+                response = self.http.request("GET", url, timeout=self.http.timeout * 3)
+                response.raise_for_status()
+                movies = response.json()
+            except (requests.exceptions.RequestException, JSONDecodeError) as e:
+                self.logger.error(
+                    f"Failed to load the Radarr library: {e}. Looking movies up one by one until the next cycle."
+                )
+                self._library_failed = True
+                return None
+
+            self._library = {
+                movie["tmdbId"]: movie for movie in movies if movie.get("tmdbId")
+            }
+            self.logger.info(
+                f"Loaded Radarr library snapshot with {len(self._library)} movies."
+            )
+            return self._library
+
+    def invalidate_library(self) -> None:
+        """Drops the library snapshot so the next lookup reloads it."""
+        with self._library_lock:
+            self._library = None
+            self._library_failed = False
+
+    def _update_library(self, movie_data: dict) -> None:
+        """Adds or refreshes a single movie in the library snapshot."""
+        with self._library_lock:
+            if self._library is not None and movie_data.get("tmdbId"):
+                self._library[movie_data["tmdbId"]] = movie_data
+
+    def is_in_library(self, tmdb_id: str | int) -> bool | None:
+        """
+        Whether a movie is already part of the local Radarr library.
+        Returns None if the library can't be loaded.
+        """
+        library = self._get_library()
+        if library is None:
+            return None
+        return int(tmdb_id) in library
+
+    def get_library_state(self, tmdb_id: str | int) -> RadarrState | None:
+        """Returns the state of a movie from the library snapshot only, without any lookup."""
+        library = self._get_library()
+        if library is None or int(tmdb_id) not in library:
+            return None
+        return self._to_state(library[int(tmdb_id)])
+
     def check_radarr_state(self, tmdb_id: str) -> RadarrState | None:
         """
         Check if a file exists for a given TMDB ID in Radarr.
+        Movies already in the library are answered from the snapshot;
+        only unknown movies go through the slow /movie/lookup endpoint.
         """
+        library = self._get_library()
+        if library is not None and int(tmdb_id) in library:
+            return self._to_state(library[int(tmdb_id)])
+
         url = f"{self.base_url}/movie/lookup"
         params = {"term": f"tmdb:{tmdb_id}"}
 
         try:
-            response = requests.get(
-                url, params=params, headers=self.headers, timeout=20
-            )
+            response = self.http.request("GET", url, params=params)
             response.raise_for_status()
 
             content_type = response.headers.get("Content-Type", "")
@@ -83,15 +175,7 @@ class RadarrClient:
             self.logger.info(f"No results found in Radarr for TMDB ID: {tmdb_id}")
             return None
 
-        movie_data = res[0]
-        return {
-            "hasFile": movie_data.get("movieFile") is not None,
-            "monitored": movie_data.get("monitored", False),
-            "name": movie_data.get("title"),
-            "tmdbId": movie_data.get("tmdbId"),
-            "productionYear": movie_data.get("year"),
-            "is_animation": "Animation" in movie_data.get("genres", []),
-        }
+        return self._to_state(res[0])
 
     def get_movies_state(self, tmdb_ids: set[str]) -> list[RadarrState]:
         """Processes a list of TMDB IDs and returns their Radarr states."""
@@ -102,26 +186,128 @@ class RadarrClient:
                 states.append(state)
         return states
 
-    def add_to_radarr_download_queue(
+    def _filter_new_movies(self, movies: list[dict]) -> list[dict]:
+        """Drops movies that are already in the Radarr library snapshot."""
+        new_movies = []
+        for movie in movies:
+            if self.is_in_library(movie["tmdbId"]):
+                self.logger.debug(f"Movie {movie['name']} already exists in Radarr.")
+                continue
+            new_movies.append(movie)
+        return new_movies
+
+    @staticmethod
+    def _movie_body(
+        movie: dict, root_path: str, quality_profile_id: int, search: bool
+    ) -> dict:
+        return {
+            "tmdbId": movie["tmdbId"],
+            "title": movie["name"],
+            "year": movie["productionYear"],
+            "qualityProfileId": quality_profile_id,
+            "monitored": True,
+            "rootFolderPath": root_path,
+            "addOptions": {"searchForMovie": search},
+        }
+
+    def import_movies(
         self, movies: list[dict], root_path: str, quality_profile_id: int
     ):
+        """
+        Adds many movies at once through Radarr's bulk import endpoint, then starts
+        a single search command for all of them instead of one search per movie.
+        Falls back to per-movie adds if the bulk endpoint fails.
+        """
+        movies = self._filter_new_movies(movies)
+        if not movies:
+            return
+
+        url = self.base_url + "/movie/import"
         bodies = [
-            {
-                "tmdbId": movie["tmdbId"],
-                "title": movie["name"],
-                "year": movie["productionYear"],
-                "qualityProfileId": quality_profile_id,
-                "monitored": True,
-                "rootFolderPath": root_path,
-                "addOptions": {"searchForMovie": True},
-            }
+            self._movie_body(movie, root_path, quality_profile_id, search=False)
             for movie in movies
         ]
+        try:
+            response = self.http.request(
+                "POST", url, json=bodies, timeout=self.http.timeout * 3
+            )
+            response.raise_for_status()
+            imported = response.json()
+        except (requests.exceptions.RequestException, JSONDecodeError) as e:
+            self.logger.warning(
+                f"Bulk import of {len(movies)} movies into Radarr failed ({e}). Adding them one by one."
+            )
+            self.add_to_radarr_download_queue(movies, root_path, quality_profile_id)
+            return
+
+        for movie_data in imported:
+            self._update_library(movie_data)
+        self.logger.info(
+            f"Imported {len(imported)} movies into Radarr ({root_path})."
+        )
+
+        movie_ids = [movie_data["id"] for movie_data in imported if movie_data.get("id")]
+        if movie_ids:
+            self.search_movies(movie_ids)
+
+    def _start_search(self, movie_ids: list[int]) -> bool:
+        """Sends a MoviesSearch command. Returns whether Radarr accepted it."""
+        url = self.base_url + "/command"
+        body = {"name": "MoviesSearch", "movieIds": movie_ids}
+        try:
+            response = self.http.request("POST", url, json=body)
+        except requests.exceptions.RequestException as e:
+            self.logger.error(
+                f"Failed to start Radarr search for {len(movie_ids)} movies: {e}"
+            )
+            return False
+        if response.status_code not in (200, 201):
+            self.logger.error(
+                f"Failed to start Radarr search for {len(movie_ids)} movies. Status: {response.status_code}, Response: {response.text}"
+            )
+            return False
+        return True
+
+    def search_movies(self, movie_ids: list[int]):
+        """
+        Starts a search for movies added without one, in a single command.
+        If Radarr rejects it, each movie is searched on its own: once imported,
+        the movies are skipped by later syncs and would never be searched otherwise.
+        """
+        if self._start_search(movie_ids):
+            self.logger.info(f"Started Radarr search for {len(movie_ids)} imported movies.")
+            return
+
+        failed = movie_ids
+        if len(movie_ids) > 1:
+            self.logger.warning(
+                f"Searching the {len(movie_ids)} imported movies one by one instead."
+            )
+            failed = [
+                movie_id for movie_id in movie_ids if not self._start_search([movie_id])
+            ]
+        if failed:
+            self.logger.error(
+                f"Could not start a Radarr search for {len(failed)} imported movies (Radarr IDs: {failed}). "
+                "They can be searched from Radarr's Wanted > Missing page."
+            )
+        else:
+            self.logger.info(
+                f"Started Radarr search for {len(movie_ids)} imported movies."
+            )
+
+    def add_to_radarr_download_queue(
+        self, movies: list[dict], root_path: str, quality_profile_id: int
+    ):
+        bodies = [
+            self._movie_body(movie, root_path, quality_profile_id, search=True)
+            for movie in self._filter_new_movies(movies)
+        ]
 
         url = self.base_url + "/movie"
 
         for body in bodies:
-            response = requests.post(url, json=body, headers=self.headers, timeout=20)
+            response = self.http.request("POST", url, json=body)
             if response.status_code != 201:
                 if (
                     response.status_code == 400
@@ -135,4 +321,8 @@ class RadarrClient:
                     f"Failed to add movie {body.get('title')} to Radarr. Status: {response.status_code}, Response: {response.text}"
                 )
             else:
-                self.logger.info(f"Added movie {body.get('title')} to Radarr download queue.")
\ No newline at end of file
+                self.logger.info(f"Added movie {body.get('title')} to Radarr download queue.")
+                try:
+                    self._update_library(response.json())
+                except JSONDecodeError:
+                    pass
\ No newline at end of file
@@ -0,0 +1,169 @@
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any
+from urllib.parse import urlparse
+
+logger = logging.getLogger("letterboxd-sync")
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parses a Retry-After header (delay in seconds or HTTP date) into seconds."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Callers reserve a token and get back how long they
+    must wait before using it, so it works for both threads and asyncio tasks.
+    The refill rate adapts: it is halved when the server throttles us and
+    slowly recovers towards the configured rate on success.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.base_rate = rate
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.throttle_strikes = 0
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Takes one token and returns the number of seconds to wait before using it."""
+        with self.lock:
+            now = time.monotonic()
+            # Nothing refills while the bucket is blocked: `updated` is then in the future
+            if now > self.updated:
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+            self.tokens -= 1
+
+            # A negative balance is a queue of reservations waiting for refills,
+            # which start once the block is over
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(0.0, self.updated - now) + wait
+
+    def throttled(self, retry_after: float | None, backoff_base: float, backoff_max: float) -> float:
+        """
+        Backs off after a 429: blocks the bucket for `retry_after` seconds (or an
+        exponential backoff when the server gives none) and halves the refill rate.
+        Returns the pause applied.
+        """
+        with self.lock:
+            if retry_after is None:
+                retry_after = min(backoff_base * 2**self.throttle_strikes, backoff_max)
+            self.throttle_strikes += 1
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            self.rate = max(self.base_rate / 16, self.rate / 2)
+            # Restart the refill when the block ends, with a single token, so the
+            # requests queued behind it go out one by one instead of all at once
+            if self.updated < self.blocked_until:
+                self.updated = self.blocked_until
+                self.tokens = min(self.tokens, 1.0)
+            return retry_after
+
+    def succeeded(self):
+        """Slowly restores the refill rate after successful requests."""
+        with self.lock:
+            self.throttle_strikes = 0
+            if self.rate < self.base_rate:
+                self.rate = min(self.base_rate, self.rate + self.base_rate * 0.1)
+
+
+class RateLimiter:
+    """
+    Spaces out Letterboxd requests with one token bucket per proxy and one per
+    egress IP (the proxy host, or 'direct'), plus optional random jitter.
+    """
+
+    def __init__(
+        self,
+        per_proxy_rps: float,
+        per_ip_rps: float,
+        burst: float = 2,
+        jitter: float = 0.5,
+        backoff_base: float = 30,
+        backoff_max: float = 600,
+    ):
+        self.per_proxy_rps = per_proxy_rps
+        self.per_ip_rps = per_ip_rps
+        self.burst = burst
+        self.jitter = jitter
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._buckets: dict[tuple[str, str], TokenBucket] = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: dict[str, Any]) -> "RateLimiter":
+        """Builds a limiter from the `letterboxd.rate_limit` config section."""
+        return cls(
+            per_proxy_rps=config.get("per_proxy_rps", 1.0),
+            per_ip_rps=config.get("per_ip_rps", 2.0),
+            burst=config.get("burst", 2),
+            jitter=config.get("jitter", 0.5),
+            backoff_base=config.get("backoff_base_seconds", 30),
+            backoff_max=config.get("backoff_max_seconds", 600),
+        )
+
+    def _buckets_for(self, proxy: dict[str, str] | None) -> list[TokenBucket]:
+        proxy_url = proxy.get("https", proxy.get("http", "")) if proxy else ""
+        keys = [
+            ("proxy", proxy_url or "direct", self.per_proxy_rps),
+            ("ip", urlparse(proxy_url).hostname or "direct", self.per_ip_rps),
+        ]
+        with self.lock:
+            buckets = []
+            for kind, key, rate in keys:
+                if rate <= 0:
+                    continue
+                if (kind, key) not in self._buckets:
+                    self._buckets[(kind, key)] = TokenBucket(rate, self.burst)
+                buckets.append(self._buckets[(kind, key)])
+            return buckets
+
+    def reserve(self, proxy: dict[str, str] | None) -> float:
+        """
+        Reserves a request slot through `proxy` (None for direct connections).
+        Returns the number of seconds to wait before sending the request.
+        """
+        wait = max((bucket.reserve() for bucket in self._buckets_for(proxy)), default=0.0)
+        if self.jitter > 0:
+            wait += random.uniform(0, self.jitter)
+        return wait
+
+    def acquire(self, proxy: dict[str, str] | None):
+        """Blocks until a request through `proxy` is allowed."""
+        time.sleep(self.reserve(proxy))
+
+    def record_throttled(self, proxy: dict[str, str] | None, retry_after: float | None):
+        """Backs off a proxy and its egress IP after Letterboxd answered 429."""
+        pause = 0.0
+        for bucket in self._buckets_for(proxy):
+            pause = max(
+                pause, bucket.throttled(retry_after, self.backoff_base, self.backoff_max)
+            )
+        logger.warning(f"Letterboxd is rate limiting us, backing off for {pause:.0f}s")
+
+    def record_success(self, proxy: dict[str, str] | None):
+        for bucket in self._buckets_for(proxy):
+            bucket.succeeded()
@@ -0,0 +1,41 @@
+import logging
+import sqlite3
+import threading
+from typing import Callable, Generic, TypeVar
+
+logger = logging.getLogger("letterboxd-sync")
+
+T = TypeVar("T")
+
+
+class SharedCache(Generic[T]):
+    """
+    A process-wide sqlite cache, opened on first use by `open_cache(path)`.
+    If it can't be opened, callers get None and carry on without it;
+    the next call tries again.
+    """
+
+    def __init__(self, description: str, path: str, open_cache: Callable[[str], T]):
+        self.description = description
+        self.path = path
+        self._open_cache = open_cache
+        self._cache: T | None = None
+        self._lock = threading.Lock()
+
+    def get(self) -> T | None:
+        with self._lock:
+            if self._cache is None:
+                try:
+                    self._cache = self._open_cache(self.path)
+                    logger.info(f"Using {self.description} at '{self.path}'")
+                except sqlite3.Error as e:
+                    logger.error(
+                        f"Could not open {self.description} at '{self.path}': {e}. Continuing without cache."
+                    )
+                    return None
+            return self._cache
+
+    def reset(self):
+        """Forgets the opened cache so the next call reopens it with the current configuration."""
+        with self._lock:
+            self._cache = None
@@ -4,6 +4,15 @@ from typing import Any
 
 STATE_FILE_PATH = os.getenv("SYNC_STATE_PATH", "sync_state.json")
 
+
+def data_file_path(env_var: str, filename: str) -> str:
+    """
+    Location of an on-disk cache: the `env_var` environment variable if set,
+    else `filename` next to the sync state file.
+    """
+    return os.getenv(env_var, os.path.join(os.path.dirname(STATE_FILE_PATH), filename))
+
+
 def load_state() -> dict[str, Any]:
     """
     Loads the state file (sync_state.json).
@@ -21,8 +30,26 @@ def load_state() -> dict[str, Any]:
 def save_state(data: dict[str, Any]):
     """Saves the state dictionary back to the JSON file."""
     try:
-        with open(STATE_FILE_PATH, "w", encoding="utf-8") as f:
+        # Write to a temporary file first so a crash never leaves a truncated state
+        tmp_path = STATE_FILE_PATH + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
             json.dump(data, f, indent=2)
+        os.replace(tmp_path, STATE_FILE_PATH)
     except IOError as e:
         print(f"ERROR: Could not write to state file: {e}")
 
+
+def get_user_state(data: dict[str, Any], username: str) -> dict[str, Any]:
+    """
+    Returns a copy of a user's sync state:
+    {"latest_tmdb_id": str, "anchors": [slugs at the top of the watchlist],
+     "watchlist_fingerprint": str, "pending": [TMDB IDs requested but not yet in Jellyfin]}.
+    Older state files stored only the latest TMDB ID and are upgraded on read;
+    it is still used to stop the scrape until anchors have been recorded.
+    """
+    user_state = data.get(username)
+    if user_state is None:
+        return {}
+    if isinstance(user_state, str):
+        return {"latest_tmdb_id": user_state}
+    return dict(user_state)
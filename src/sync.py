@@ -1,9 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor
+
 from src.config import config
 from src.logger import setup_logger
 from src.letterboxd import get_new_watchlist_tmdb_ids
-from src.radarr import RadarrClient
+from src.letterboxd_async import scrape_watchlist_async
+from src.radarr import RadarrClient, RadarrState
 from src.jellyfin import Jellyfin
-from src.proxies import ProxyManager
+from src.proxies import get_proxy_manager
 
 
 class SyncManager:
@@ -12,13 +15,20 @@ class SyncManager:
         user_config: dict,
         jellyfin: Jellyfin,
         radarr: RadarrClient,
-        latest_synced_tmdb_id: str | None,
+        user_state: dict,
     ):
         self.user_config = user_config
         self.letterboxd_username = user_config["letterboxd_username"]
         self.jellyfin_collection_id = user_config["jellyfin_collection_id"]
         self.jellyfin_username = user_config.get("jellyfin_username")
-        self.latest_synced_tmdb_id = latest_synced_tmdb_id
+        self.user_state = user_state
+        self.latest_synced_tmdb_id = user_state.get("latest_tmdb_id")
+        # Fingerprint of the first watchlist page as of the last completed sync
+        self.watchlist_fingerprint = user_state.get("watchlist_fingerprint")
+        # Slugs of the films at the top of the watchlist as of the last completed sync
+        self.anchors: list[str] = list(user_state.get("anchors", []))
+        # TMDB IDs requested in Radarr but not yet available in Jellyfin
+        self.pending: list[str] = list(user_state.get("pending", []))
 
         self.jellyfin = jellyfin
         self.radarr = radarr
@@ -26,12 +36,104 @@ class SyncManager:
 
         letterboxd_config = config.get("letterboxd", {})
         self.max_workers = letterboxd_config.get("max_concurrent_requests", 5)
-        self.proxy_manager = ProxyManager(letterboxd_config)
+        self.page_lookahead = letterboxd_config.get("page_lookahead", 2)
+        self.engine = letterboxd_config.get("engine", "threads")
+        self.per_proxy_concurrency = letterboxd_config.get("per_proxy_concurrency", 2)
+        self.proxy_manager = get_proxy_manager(letterboxd_config)
+
+    @staticmethod
+    def _root_folder_for(state: RadarrState) -> str:
+        """Returns the Radarr root folder a movie should be added to."""
+        radarr_config = config.get("radarr", {})
+        folder_path = radarr_config.get("root_folder_path", "")
+        if radarr_config.get("animated_movies", {}).get("enabled") and state.get(
+            "is_animation"
+        ):
+            folder_path = radarr_config.get("animated_movies", {}).get(
+                "root_folder_path", folder_path
+            )
+        return folder_path
+
+    def _request_in_radarr(self, tmdb_id: str, add: bool) -> RadarrState | None:
+        """
+        Looks up a movie in Radarr and, if `add` is set, requests its download.
+        Returns its Radarr state, or None if Radarr doesn't know the movie.
+        """
+        state = self.radarr.check_radarr_state(tmdb_id)
+        if not state or not add:
+            return state
+
+        # Immediately request in Radarr, mimicking Go version
+        self.radarr.add_to_radarr_download_queue(
+            [state],
+            self._root_folder_for(state),
+            config.get("radarr", {}).get("quality_profile_id"),
+        )
+        return state
+
+    def _bulk_import_in_radarr(self, states: list[RadarrState]):
+        """Submits all new movies to Radarr in one import per root folder."""
+        by_folder: dict[str, list[RadarrState]] = {}
+        for state in states:
+            by_folder.setdefault(self._root_folder_for(state), []).append(state)
+
+        for folder_path, folder_states in by_folder.items():
+            self.radarr.import_movies(
+                folder_states,
+                folder_path,
+                config.get("radarr", {}).get("quality_profile_id"),
+            )
+
+    def _updated_state(self, new_latest_id: str | None) -> dict:
+        """Returns the user's state to persist after this sync."""
+        state = dict(self.user_state)
+        if new_latest_id:
+            state["latest_tmdb_id"] = new_latest_id
+        if self.watchlist_fingerprint:
+            state["watchlist_fingerprint"] = self.watchlist_fingerprint
+        if self.anchors:
+            state["anchors"] = self.anchors
+        state["pending"] = self.pending
+        return state
+
+    def _available_pending_movie_ids(self) -> list[str]:
+        """
+        Returns the Jellyfin IDs of pending movies that became available, and
+        removes them from the queue. Movies removed from Radarr in the meantime
+        are dropped from the queue too.
+        """
+        if not self.pending:
+            return []
+
+        jellyfin_ids_to_add = []
+        still_pending = []
+        for tmdb_id in self.pending:
+            state = self.radarr.get_library_state(tmdb_id)
+            jellyfin_id = self.jellyfin.get_movie_id(
+                state.get("name") if state else None,
+                state.get("productionYear") if state else None,
+                tmdb_id=tmdb_id,
+            )
+            if jellyfin_id:
+                jellyfin_ids_to_add.append(jellyfin_id)
+            elif self.radarr.is_in_library(tmdb_id) is False:
+                self.logger.info(
+                    f"[{self.letterboxd_username}] TMDB ID {tmdb_id} is no longer in Radarr, dropping it from the pending queue."
+                )
+            else:
+                still_pending.append(tmdb_id)
 
-    def run(self) -> str | None:
+        self.pending = still_pending
+        if still_pending:
+            self.logger.info(
+                f"[{self.letterboxd_username}] {len(still_pending)} movies still waiting to become available."
+            )
+        return jellyfin_ids_to_add
+
+    def run(self) -> dict:
         """
         Orchestrates the sync process for a single user.
-        Returns the new latest_synced_tmdb_id if it has changed, otherwise None.
+        Returns the user's updated state (latest synced TMDB ID and pending queue).
         """
         self.logger.info(f"[{self.letterboxd_username}] Starting sync...")
         new_latest_id = None
@@ -40,15 +142,36 @@ class SyncManager:
             self.logger.error(
                 f"[{self.letterboxd_username}] 'jellyfin_username' is not defined in config. Aborting."
             )
-            return None
+            return self.user_state
 
         # 1. Get ONLY NEW movies from Letterboxd Watchlist
-        new_tmdb_ids = get_new_watchlist_tmdb_ids(
-            self.letterboxd_username,
-            self.proxy_manager,
-            self.max_workers,
-            self.latest_synced_tmdb_id,
-        )
+        # The single latest TMDB ID only stops scrapes of state without anchors
+        legacy_stop_id = None if self.anchors else self.latest_synced_tmdb_id
+        if self.engine == "async":
+            scan = scrape_watchlist_async(
+                self.letterboxd_username,
+                self.proxy_manager,
+                self.max_workers,
+                legacy_stop_id,
+                self.page_lookahead,
+                self.per_proxy_concurrency,
+                self.watchlist_fingerprint,
+                self.anchors,
+            )
+        else:
+            scan = get_new_watchlist_tmdb_ids(
+                self.letterboxd_username,
+                self.proxy_manager,
+                self.max_workers,
+                legacy_stop_id,
+                self.page_lookahead,
+                self.watchlist_fingerprint,
+                self.anchors,
+            )
+        new_tmdb_ids = scan.tmdb_ids
+        if scan.fingerprint:
+            self.watchlist_fingerprint = scan.fingerprint
+            self.anchors = scan.anchors
 
         if not new_tmdb_ids:
             self.logger.info(
@@ -59,50 +182,33 @@ class SyncManager:
                 f"[{self.letterboxd_username}] Found {len(new_tmdb_ids)} new movies on Letterboxd watchlist."
             )
 
-            # 2. Process new movies: get Radarr state and immediately request download
+            # 2. Process new movies: get Radarr state and immediately request download,
+            # running several movies at once but keeping the watchlist order
             radarr_states_for_new_movies = []
-            radarr_config = config.get("radarr", {})
-
-            for tmdb_id in new_tmdb_ids:
-                state = self.radarr.check_radarr_state(tmdb_id)
-                if state:
-                    folder_path = radarr_config.get("root_folder_path", "")
-                    if radarr_config.get("animated_movies", {}).get(
-                        "enabled"
-                    ) and state.get("is_animation"):
-                        folder_path = radarr_config.get("animated_movies", {}).get(
-                            "root_folder_path", folder_path
-                        )
-
-                    # Immediately request in Radarr, mimicking Go version
-                    self.radarr.add_to_radarr_download_queue(
-                        [state],
-                        folder_path,
-                        radarr_config.get("quality_profile_id"),
+            radarr_workers = config.get("radarr", {}).get("max_concurrent_requests", 4)
+            bulk_import = config.get("radarr", {}).get("bulk_import", True)
+
+            with ThreadPoolExecutor(max_workers=max(1, radarr_workers)) as executor:
+                futures = [
+                    executor.submit(
+                        self._request_in_radarr, tmdb_id, not bulk_import
                     )
-                    radarr_states_for_new_movies.append(state)
+                    for tmdb_id in new_tmdb_ids
+                ]
+                for future in futures:
+                    state = future.result()
+                    if state:
+                        radarr_states_for_new_movies.append(state)
+
+            if bulk_import:
+                self._bulk_import_in_radarr(radarr_states_for_new_movies)
 
-            # 3. Add newly available movies to Jellyfin collection
+            # 3. Queue every movie Radarr knows until it is available in Jellyfin
             if self.jellyfin_collection_id:
-                jellyfin_ids_to_add = []
                 for movie in radarr_states_for_new_movies:
-                    if movie.get("hasFile"):
-                        production_year = movie.get("productionYear")
-                        movie_name = movie.get("name")
-                        if production_year is not None and movie_name is not None:
-                            jellyfin_id = self.jellyfin.get_movie_id(
-                                movie_name, production_year
-                            )
-                            if jellyfin_id:
-                                jellyfin_ids_to_add.append(jellyfin_id)
-
-                if jellyfin_ids_to_add:
-                    self.logger.info(
-                        f"[{self.letterboxd_username}] Adding {len(jellyfin_ids_to_add)} new and available movies to Jellyfin collection."
-                    )
-                    self.jellyfin.add_to_collection(
-                        jellyfin_ids_to_add, self.jellyfin_collection_id
-                    )
+                    tmdb_id = str(movie["tmdbId"])
+                    if tmdb_id not in self.pending:
+                        self.pending.append(tmdb_id)
             else:
                 self.logger.warning(
                     f"[{self.letterboxd_username}] 'jellyfin_collection_id' is not defined in config. Skipping Jellyfin addition."
@@ -118,30 +224,38 @@ class SyncManager:
             self.logger.warning(
                 f"[{self.letterboxd_username}] Collection '{self.jellyfin_collection_id}' not found for watched movie removal scan."
             )
-            return new_latest_id  # Return the new ID even if this part fails
+            return self._updated_state(new_latest_id)  # Return the new ID even if this part fails
+
+        # 4. Movies that finished downloading, whether new or from earlier cycles
+        jellyfin_ids_to_add = self._available_pending_movie_ids()
 
-        # 5. Remove WATCHED movies from the Jellyfin collection
+        # 5. WATCHED movies to remove from the Jellyfin collection
+        played_movie_ids = []
         user_id = self.jellyfin.get_user_id(self.jellyfin_username)
-        if not user_id:
+        if user_id:
+            played_movie_ids = self.jellyfin.get_played_movies_from_collection(
+                self.jellyfin_collection_id, user_id
+            )
+        else:
             self.logger.error(
                 f"[{self.letterboxd_username}] Could not find Jellyfin user ID for '{self.jellyfin_username}'."
             )
-            return new_latest_id
 
-        played_movie_ids = self.jellyfin.get_played_movies_from_collection(
-            self.jellyfin_collection_id, user_id
+        # 6. Apply only the difference with the current collection membership
+        added, removed = self.jellyfin.reconcile_collection(
+            self.jellyfin_collection_id,
+            jellyfin_ids_to_add,
+            played_movie_ids,
+            self.letterboxd_username,
         )
-        if played_movie_ids:
+        if added or removed:
             self.logger.info(
-                f"[{self.letterboxd_username}] Removing {len(played_movie_ids)} watched movies from Jellyfin collection."
-            )
-            self.jellyfin.remove_from_collection(
-                played_movie_ids, self.jellyfin_collection_id
+                f"[{self.letterboxd_username}] Added {added} newly available movies to and removed {removed} watched movies from Jellyfin collection."
             )
         else:
             self.logger.info(
-                f"[{self.letterboxd_username}] No new watched movies to remove from collection."
+                f"[{self.letterboxd_username}] Jellyfin collection already up to date."
             )
 
         self.logger.info(f"[{self.letterboxd_username}] Sync complete.")
-        return new_latest_id
+        return self._updated_state(new_latest_id)
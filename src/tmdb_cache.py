@@ -0,0 +1,106 @@
+import sqlite3
+import threading
+import time
+
+from src.config import config
+from src.shared_cache import SharedCache
+from src.state_manager import data_file_path
+
+TMDB_CACHE_PATH = data_file_path("TMDB_CACHE_PATH", "tmdb_cache.db")
+
+
+class TmdbCache:
+    """
+    Persistent mapping of Letterboxd film slugs to TMDB IDs.
+
+    A slug never changes its TMDB ID, so positive results are kept forever.
+    Negative results (TV shows, pages without a TMDB link) are kept for
+    `negative_ttl` seconds so they get re-checked from time to time.
+    """
+
+    def __init__(self, path: str, negative_ttl: float):
+        self.path = path
+        self.negative_ttl = negative_ttl
+        self.lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS tmdb_ids (
+                    slug TEXT PRIMARY KEY,
+                    tmdb_id TEXT,
+                    reason TEXT,
+                    fetched_at REAL NOT NULL
+                )
+                """
+            )
+
+    def lookup(self, slug: str) -> tuple[bool, str | None]:
+        """
+        Look up a slug in the cache.
+        Returns a (hit, tmdb_id) tuple; tmdb_id is None for cached negative results.
+        """
+        with self.lock:
+            row = self._conn.execute(
+                "SELECT tmdb_id, fetched_at FROM tmdb_ids WHERE slug = ?", (slug,)
+            ).fetchone()
+
+        if row is None:
+            return False, None
+
+        tmdb_id, fetched_at = row
+        if tmdb_id is None and time.time() - fetched_at > self.negative_ttl:
+            return False, None
+        return True, tmdb_id
+
+    def lookup_many(self, slugs: list[str]) -> dict[str, str | None]:
+        """
+        Look up several slugs in a single query.
+        Returns a mapping of every cache hit to its TMDB ID (None for negative results).
+        """
+        if not slugs:
+            return {}
+
+        placeholders = ",".join("?" * len(slugs))
+        with self.lock:
+            rows = self._conn.execute(
+                f"SELECT slug, tmdb_id, fetched_at FROM tmdb_ids WHERE slug IN ({placeholders})",
+                slugs,
+            ).fetchall()
+
+        now = time.time()
+        return {
+            slug: tmdb_id
+            for slug, tmdb_id, fetched_at in rows
+            if tmdb_id is not None or now - fetched_at <= self.negative_ttl
+        }
+
+    def store(self, slug: str, tmdb_id: str | None, reason: str | None = None):
+        """Store a resolved slug. A None tmdb_id records a negative result."""
+        with self.lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tmdb_ids (slug, tmdb_id, reason, fetched_at) VALUES (?, ?, ?, ?)",
+                (slug, tmdb_id, reason, time.time()),
+            )
+
+
+def _open_tmdb_cache(path: str) -> TmdbCache:
+    cache_config = config.get("letterboxd", {}).get("tmdb_cache", {})
+    return TmdbCache(path, cache_config.get("negative_ttl_hours", 168) * 3600)
+
+
+_tmdb_cache = SharedCache("TMDB ID cache", TMDB_CACHE_PATH, _open_tmdb_cache)
+
+
+def get_tmdb_cache() -> TmdbCache | None:
+    """
+    Returns the process-wide TMDB ID cache, or None if it is disabled or unavailable.
+    """
+    if not config.get("letterboxd", {}).get("tmdb_cache", {}).get("enabled", True):
+        return None
+    return _tmdb_cache.get()
+
+
+def reset_tmdb_cache():
+    """Reopens the TMDB ID cache on next use, e.g. after a configuration reload."""
+    _tmdb_cache.reset()
@@ -0,0 +1,155 @@
+import hmac
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger("letterboxd-sync")
+
+RADARR_PATH = "/webhooks/radarr"
+JELLYFIN_PATH = "/webhooks/jellyfin"
+
+
+class WebhookHandlers:
+    """Callbacks run for the events accepted by the webhook listener."""
+
+    def __init__(
+        self,
+        on_movie_imported: Callable[[str], None],
+        on_movie_played: Callable[[str, str], None],
+    ):
+        # on_movie_imported(tmdb_id)
+        self.on_movie_imported = on_movie_imported
+        # on_movie_played(jellyfin_item_id, jellyfin_username)
+        self.on_movie_played = on_movie_played
+
+
+def _parse_radarr_event(payload: dict[str, Any]) -> str | None:
+    """Returns the TMDB ID of a Radarr 'On Import' (Download) event, else None."""
+    if payload.get("eventType") != "Download":
+        return None
+    tmdb_id = (payload.get("movie") or {}).get("tmdbId")
+    return str(tmdb_id) if tmdb_id else None
+
+
+def _parse_jellyfin_event(payload: dict[str, Any]) -> tuple[str, str] | None:
+    """
+    Returns (item_id, username) of a Jellyfin webhook plugin 'Playback Stop'
+    event for a movie played to completion, else None.
+    """
+    if payload.get("NotificationType") != "PlaybackStop":
+        return None
+    if payload.get("ItemType", "Movie") != "Movie":
+        return None
+    if str(payload.get("PlayedToCompletion", "")).lower() != "true":
+        return None
+
+    item_id = payload.get("ItemId")
+    username = payload.get("NotificationUsername")
+    if not item_id or not username:
+        return None
+    return str(item_id), str(username)
+
+
+class WebhookServer:
+    """
+    Lightweight HTTP listener for Radarr and Jellyfin webhooks.
+
+    Requests must carry the shared `token`. They are acknowledged immediately;
+    the targeted updates they trigger run on a small background pool so the
+    sender never waits on Jellyfin.
+    """
+
+    def __init__(self, host: str, port: int, token: str, handlers: WebhookHandlers):
+        self.token = token.encode()
+        self.handlers = handlers
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="webhook")
+        self._server = ThreadingHTTPServer((host, port), self._make_request_handler())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    def _authorized(self, request: BaseHTTPRequestHandler) -> bool:
+        # Compared as bytes: compare_digest rejects non-ASCII str
+        header = request.headers.get("X-Webhook-Token")
+        if header:
+            # http.server decodes header bytes as latin-1
+            supplied = header.encode("latin-1", "replace")
+        else:
+            query = parse_qs(urlparse(request.path).query)
+            supplied = query.get("token", [""])[0].encode()
+        return hmac.compare_digest(supplied, self.token)
+
+    def _run_safely(self, callback: Callable[..., None], *args: Any):
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.error(f"Webhook handler failed: {e}", exc_info=True)
+
+    def _dispatch(self, path: str, payload: dict[str, Any]):
+        if path == RADARR_PATH:
+            tmdb_id = _parse_radarr_event(payload)
+            if tmdb_id:
+                logger.info(f"Radarr webhook: movie imported (TMDB ID: {tmdb_id})")
+                self._executor.submit(
+                    self._run_safely, self.handlers.on_movie_imported, tmdb_id
+                )
+        elif path == JELLYFIN_PATH:
+            event = _parse_jellyfin_event(payload)
+            if event:
+                logger.info(
+                    f"Jellyfin webhook: movie {event[0]} watched by {event[1]}"
+                )
+                self._executor.submit(
+                    self._run_safely, self.handlers.on_movie_played, *event
+                )
+
+    def _make_request_handler(self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                path = urlparse(self.path).path
+                if path not in (RADARR_PATH, JELLYFIN_PATH):
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                if not server._authorized(self):
+                    self.send_response(401)
+                    self.end_headers()
+                    return
+
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    self.send_response(400)
+                    self.end_headers()
+                    return
+
+                self.send_response(202)
+                self.end_headers()
+                if isinstance(payload, dict):
+                    server._dispatch(path, payload)
+
+            def log_message(self, format, *args):
+                logger.debug(f"Webhook request: {format % args}")
+
+        return RequestHandler
+
+    def start(self):
+        """Starts serving in a background thread."""
+        host, port = self._server.server_address[:2]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="webhook-server", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Webhook listener running on http://{host}:{port}")
+
+    def stop(self):
+        """Stops the listener and waits for pending handlers."""
+        self._server.shutdown()
+        self._server.server_close()
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,19 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+# src.config loads its file at import time; point it at the example configuration
+# and keep every on-disk cache out of the working tree
+_data_dir = tempfile.mkdtemp(prefix="letterboxd-sync-tests-")
+os.environ.setdefault("CONFIG_PATH", str(ROOT / "config.example.yaml"))
+os.environ.setdefault("SYNC_STATE_PATH", os.path.join(_data_dir, "sync_state.json"))
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def read_fixture(name: str) -> bytes:
+    return (FIXTURES / name).read_bytes()
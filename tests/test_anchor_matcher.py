@@ -0,0 +1,68 @@
+from src.html_parser import Poster, WatchlistPage
+from src.letterboxd import AnchorMatcher
+
+
+def _page(*slugs: str, next_href: str | None = None) -> WatchlistPage:
+    return WatchlistPage([Poster(slug) for slug in slugs], next_href)
+
+
+def _slugs(page: WatchlistPage) -> list[str]:
+    return [poster.endpoint for poster in page.posters]
+
+
+def test_stops_at_unchanged_top():
+    page, anchor = AnchorMatcher(["a", "b", "c"]).cut(_page("x", "a", "b", "c", "d"))
+
+    assert (_slugs(page), anchor) == (["x"], "a")
+
+
+def test_re_added_anchor_does_not_hide_new_films():
+    page, anchor = AnchorMatcher(["a", "b", "c"]).cut(_page("a", "y", "b", "c", "d"))
+
+    assert (_slugs(page), anchor) == (["a", "y"], "b")
+
+
+def test_removed_anchors_are_skipped():
+    page, anchor = AnchorMatcher(["a", "b", "c"]).cut(_page("x", "a", "c", "d"))
+
+    assert (_slugs(page), anchor) == (["x"], "a")
+
+
+def test_anchor_confirmed_across_pages():
+    matcher = AnchorMatcher(["a", "b"])
+
+    first, anchor = matcher.cut(_page("x", "a", next_href="/u/watchlist/page/2/"))
+    assert (_slugs(first), anchor) == (["x"], None)
+
+    second, anchor = matcher.cut(_page("b", "c"))
+    assert (_slugs(second), anchor) == ([], "a")
+
+
+def test_unconfirmed_anchor_across_pages_is_a_new_film():
+    matcher = AnchorMatcher(["a", "b", "c"])
+
+    matcher.cut(_page("a", next_href="/u/watchlist/page/2/"))
+    second, anchor = matcher.cut(_page("y", "b", "c"))
+
+    assert (_slugs(second), anchor) == (["a", "y"], "b")
+
+
+def test_anchor_ending_the_watchlist():
+    page, anchor = AnchorMatcher(["a"]).cut(_page("x", "y", "a"))
+
+    assert (_slugs(page), anchor) == (["x", "y"], "a")
+
+
+def test_last_anchor_alone_is_not_trusted():
+    # 'b' may have been re-added: nothing recorded after it can confirm it
+    page, anchor = AnchorMatcher(["a", "b"]).cut(
+        _page("b", "y", next_href="/u/watchlist/page/2/")
+    )
+
+    assert (_slugs(page), anchor) == (["b", "y"], None)
+
+
+def test_no_anchors_keeps_every_film():
+    page, anchor = AnchorMatcher([]).cut(_page("x", "y", next_href="/u/watchlist/page/2/"))
+
+    assert (_slugs(page), anchor) == (["x", "y"], None)
@@ -0,0 +1,78 @@
+import pytest
+
+from conftest import read_fixture
+from src import html_parser
+from src.html_parser import (
+    HtmlParserBackend,
+    LxmlBackend,
+    Poster,
+    SelectolaxBackend,
+    WatchlistPage,
+)
+
+BACKENDS = {
+    "html.parser": HtmlParserBackend,
+    "lxml": LxmlBackend,
+    "selectolax": SelectolaxBackend,
+}
+
+
+@pytest.fixture(params=list(BACKENDS))
+def backend(request):
+    _, available = html_parser._BACKENDS[request.param]
+    if not available():
+        pytest.skip(f"{request.param} is not installed")
+    return BACKENDS[request.param]()
+
+
+def test_watchlist_page(backend):
+    page = backend.parse_watchlist(read_fixture("watchlist_page_1.html"))
+
+    assert page == WatchlistPage(
+        [
+            Poster("film/parasite-2019/"),
+            Poster("film/chernobyl/"),
+            Poster("film/perfect-days-2023/"),
+        ],
+        "/dave/watchlist/page/2/",
+    )
+
+
+def test_last_watchlist_page(backend):
+    page = backend.parse_watchlist(read_fixture("watchlist_last_page.html"))
+
+    assert page == WatchlistPage([Poster("film/stalker/")], None)
+
+
+def test_film_page_tmdb_href(backend):
+    assert (
+        backend.parse_tmdb_href(read_fixture("film_page.html"))
+        == "https://www.themoviedb.org/movie/496243/"
+    )
+    assert (
+        backend.parse_tmdb_href(read_fixture("film_page_tv.html"))
+        == "https://www.themoviedb.org/tv/87108/"
+    )
+
+
+def test_film_page_without_tmdb_link(backend):
+    assert backend.parse_tmdb_href(b"<html><body><p>No links</p></body></html>") is None
+
+
+def test_film_page_prefix_read_while_streaming(backend):
+    """A film page cut right after the TMDB link, as streamed downloads leave it."""
+    content = read_fixture("film_page.html")
+    cut = content.index(b'data-track-action="TMDB"')
+    cut = content.index(b">", cut) + 1
+
+    assert backend.parse_tmdb_href(content[:cut]) == "https://www.themoviedb.org/movie/496243/"
+
+
+def test_auto_prefers_selectolax(monkeypatch):
+    pytest.importorskip("selectolax.lexbor")
+    monkeypatch.setitem(html_parser.config, "letterboxd", {"html_parser": "auto"})
+    html_parser.reset_html_parser()
+    try:
+        assert html_parser.get_html_parser().name == "selectolax"
+    finally:
+        html_parser.reset_html_parser()
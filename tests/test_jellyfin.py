@@ -0,0 +1,56 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src import jellyfin
+from src.jellyfin import Jellyfin
+
+
+@pytest.fixture
+def users_server():
+    """Local Jellyfin stand-in answering /Users, counting how often it is called."""
+    state = {"users": [{"Name": "alice", "Id": "1"}], "calls": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            # The client also calls /System/Info when it connects
+            if self.path.startswith("/Users"):
+                state["calls"] += 1
+            body = json.dumps(state["users"]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state["url"] = f"http://127.0.0.1:{server.server_address[1]}"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def test_new_user_found_before_cache_expires(users_server, monkeypatch):
+    monkeypatch.setattr(jellyfin, "USER_MISS_REFRESH_INTERVAL", 0)
+    client = Jellyfin(users_server["url"], "api-key", user_cache_ttl=3600)
+    assert client.get_user_id("alice") == "1"
+
+    users_server["users"].append({"Name": "bob", "Id": "2"})
+
+    assert client.get_user_id("bob") == "2"
+    assert users_server["calls"] == 2
+
+
+def test_unknown_user_refreshes_are_rate_limited(users_server):
+    client = Jellyfin(users_server["url"], "api-key", user_cache_ttl=3600)
+    assert client.get_user_id("alice") == "1"
+
+    assert client.get_user_id("nobody") is None
+    assert client.get_user_id("nobody") is None
+    assert users_server["calls"] == 1
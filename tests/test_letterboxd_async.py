@@ -0,0 +1,74 @@
+import asyncio
+import threading
+
+from src.letterboxd_async import AsyncRequestSlots
+
+
+class _Tracker:
+    """Records how many holders of a slot are running at the same time."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    async def hold(self, slots: AsyncRequestSlots, duration: float = 0.01):
+        async with slots:
+            with self.lock:
+                self.active += 1
+                self.peak = max(self.peak, self.active)
+            await asyncio.sleep(duration)
+            with self.lock:
+                self.active -= 1
+
+
+def test_slots_bound_tasks_of_one_loop():
+    slots = AsyncRequestSlots(2)
+    tracker = _Tracker()
+
+    async def main():
+        await asyncio.gather(*(tracker.hold(slots) for _ in range(10)))
+
+    asyncio.run(main())
+
+    assert tracker.peak == 2
+
+
+def test_slots_are_shared_across_event_loops():
+    slots = AsyncRequestSlots(3)
+    tracker = _Tracker()
+
+    async def user_scrape():
+        await asyncio.gather(*(tracker.hold(slots) for _ in range(10)))
+
+    threads = [
+        threading.Thread(target=asyncio.run, args=(user_scrape(),)) for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert tracker.peak == 3
+    assert slots._available == 3
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    slots = AsyncRequestSlots(1)
+
+    async def main():
+        await slots.acquire()
+        waiter = asyncio.create_task(slots.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        slots.release()
+        await asyncio.gather(waiter, return_exceptions=True)
+        # Let a slot handed over to the cancelled waiter come back
+        await asyncio.sleep(0)
+
+        await asyncio.wait_for(slots.acquire(), timeout=1)
+        slots.release()
+
+    asyncio.run(main())
+
+    assert slots._available == 1
@@ -0,0 +1,18 @@
+import pytest
+
+from src.proxies import describe_error, is_proxy_fault
+
+
+@pytest.mark.parametrize("status", [None, 403, 429])
+def test_blocks_and_connection_errors_count_against_the_proxy(status):
+    assert is_proxy_fault(status)
+
+
+@pytest.mark.parametrize("status", [404, 500, 502, 503])
+def test_origin_errors_do_not_count_against_the_proxy(status):
+    assert not is_proxy_fault(status)
+
+
+def test_describe_error():
+    assert describe_error(TimeoutError(), None) == "TimeoutError"
+    assert describe_error(OSError(), 429) == "HTTP 429"
@@ -0,0 +1,84 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.radarr import RadarrClient
+
+
+@pytest.fixture
+def radarr_server():
+    """Local Radarr stand-in whose library never loads, recording the search commands it receives."""
+    state = {"commands": [], "reject_batches": False, "library_loads": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.startswith("/api/v3/movie"):
+                state["library_loads"] += 1
+                self._reply(500, {"message": "Database is locked"})
+            else:
+                self._reply(200, {})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            state["commands"].append(body["movieIds"])
+            if state["reject_batches"] and len(body["movieIds"]) > 1:
+                self._reply(500, {"message": "Internal error"})
+            else:
+                self._reply(201, {"id": len(state["commands"])})
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state["url"] = f"http://127.0.0.1:{server.server_address[1]}"
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def test_imported_movies_searched_in_one_command(radarr_server):
+    client = RadarrClient(radarr_server["url"], "api-key", retries=0)
+
+    client.search_movies([1, 2, 3])
+
+    assert radarr_server["commands"] == [[1, 2, 3]]
+
+
+def test_failed_search_command_falls_back_to_one_per_movie(radarr_server):
+    radarr_server["reject_batches"] = True
+    client = RadarrClient(radarr_server["url"], "api-key", retries=0)
+
+    client.search_movies([1, 2, 3])
+
+    assert radarr_server["commands"] == [[1, 2, 3], [1], [2], [3]]
+
+
+def test_unreachable_radarr_does_not_abort_the_sync(radarr_server):
+    client = RadarrClient(radarr_server["url"], "api-key", retries=0)
+    # Nothing listens on port 1: every command fails with a connection error
+    client.base_url = "http://127.0.0.1:1/api/v3"
+
+    client.search_movies([1, 2])
+
+
+def test_failed_library_load_is_not_retried_until_invalidated(radarr_server):
+    client = RadarrClient(radarr_server["url"], "api-key", retries=0)
+
+    assert client.is_in_library(1) is None
+    assert client.get_library_state(2) is None
+    assert radarr_server["library_loads"] == 1
+
+    client.invalidate_library()
+    assert client.is_in_library(1) is None
+    assert radarr_server["library_loads"] == 2
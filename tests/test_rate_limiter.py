@@ -0,0 +1,36 @@
+import pytest
+
+from src.rate_limiter import TokenBucket, parse_retry_after
+
+
+def test_burst_then_spaced_reservations():
+    bucket = TokenBucket(rate=2, burst=2)
+
+    waits = [bucket.reserve() for _ in range(4)]
+
+    assert waits == pytest.approx([0, 0, 0.5, 1.0], abs=0.05)
+
+
+def test_reservations_are_spaced_after_a_throttle():
+    bucket = TokenBucket(rate=1, burst=2)
+    bucket.throttled(None, 30, 600)
+
+    waits = [bucket.reserve() for _ in range(8)]
+
+    # The first request goes out when the block ends, the next ones at the halved rate
+    assert waits == pytest.approx([30 + 2 * i for i in range(8)], abs=0.05)
+
+
+def test_longer_throttle_extends_the_block():
+    bucket = TokenBucket(rate=1, burst=2)
+    bucket.throttled(10, 30, 600)
+    bucket.throttled(60, 30, 600)
+
+    assert bucket.reserve() == pytest.approx(60, abs=0.05)
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"), [(None, None), ("", None), ("120", 120.0), ("soon", None)]
+)
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
@@ -0,0 +1,46 @@
+import http.client
+from urllib.parse import quote
+
+import pytest
+
+from src.webhooks import RADARR_PATH, WebhookHandlers, WebhookServer
+
+TOKEN = "s3cret-clé"
+
+
+@pytest.fixture
+def webhook_server():
+    server = WebhookServer(
+        "127.0.0.1", 0, TOKEN, WebhookHandlers(lambda *_: None, lambda *_: None)
+    )
+    server.start()
+    yield server
+    server.stop()
+
+
+def _post(server: WebhookServer, path: str, headers: dict | None = None) -> int:
+    host, port = server._server.server_address[:2]
+    connection = http.client.HTTPConnection(host, port, timeout=5)
+    try:
+        connection.request("POST", path, body=b"{}", headers=headers or {})
+        return connection.getresponse().status
+    finally:
+        connection.close()
+
+
+def test_request_without_token_is_rejected(webhook_server):
+    assert _post(webhook_server, RADARR_PATH) == 401
+
+
+def test_request_with_wrong_token_is_rejected(webhook_server):
+    assert _post(webhook_server, RADARR_PATH, {"X-Webhook-Token": "nope"}) == 401
+
+
+def test_non_ascii_token_in_header(webhook_server):
+    headers = {"X-Webhook-Token": TOKEN.encode()}
+
+    assert _post(webhook_server, RADARR_PATH, headers) == 202
+
+
+def test_non_ascii_token_in_query(webhook_server):
+    assert _post(webhook_server, f"{RADARR_PATH}?token={quote(TOKEN)}") == 202